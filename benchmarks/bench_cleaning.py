@@ -0,0 +1,58 @@
+# bench_cleaning.py
+# Rows/sec of reading + df_cleaning before and after the schema driven rewrite.
+# Run from the repository root:  python -m benchmarks.bench_cleaning
+
+
+import sys
+import time
+
+import pandas as pd
+
+from chicago_housing_analysis import read_cleaned_csv
+
+
+def legacy_read_cleaned_csv(filenm):
+    """The original read + df_cleaning: untyped read_csv, per-row price slicing and
+    pd.to_datetime without a format."""
+
+    df = pd.read_csv(filenm, sep=',')
+    df['Median Sale Price'] = [x[1:] for x in df['Median Sale Price'].str.replace('K', '000')]
+    df['Median Sale Price'] = df['Median Sale Price'].str.replace(',', '')
+    df['Median Sale Price'] = pd.to_numeric(df['Median Sale Price'])
+    df['Period Begin'] = pd.to_datetime(df['Period Begin'])
+    df['Period End'] = pd.to_datetime(df['Period End'])
+    df['Month'] = df['Period Begin'].dt.month
+    df['Year'] = df['Period Begin'].dt.year
+
+    return df
+
+
+def rows_per_sec(func, filenm, repeat=10):
+    """Return (rows, best rows/sec) of func over repeat runs."""
+
+    best = float('inf')
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(func(filenm))
+        best = min(best, time.perf_counter() - start)
+
+    return rows, rows / best
+
+
+def main(filenm='chicago_housing_all_residential.csv'):
+
+    before = legacy_read_cleaned_csv(filenm)
+    after = read_cleaned_csv(filenm)
+    assert (before['Median Sale Price'] == after['Median Sale Price']).all()
+    assert (before['Period Begin'] == after['Period Begin']).all()
+
+    rows, old = rows_per_sec(legacy_read_cleaned_csv, filenm)
+    _, new = rows_per_sec(read_cleaned_csv, filenm)
+    print('{} rows'.format(rows))
+    print('before: {:>12,.0f} rows/sec'.format(old))
+    print('after:  {:>12,.0f} rows/sec  ({:.1f}x)'.format(new, new / old))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,59 @@
+# bench_column_store.py
+# Start-up time, per region query time and private memory of worker processes answering
+# area_ppsf_by_yr and monthly_unit_sold_yr for every region, from the cleaned dataframe versus
+# from the memory mapped column store.
+# Run from the repository root:  python -m benchmarks.bench_column_store [workers]
+
+
+import subprocess
+import sys
+
+import chicago_housing_analysis as cha
+from column_store import open_store
+
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+import chicago_housing_analysis as cha
+from column_store import open_store
+from housing_cache import load_cleaned
+from region_index import RegionIndex
+if sys.argv[1] == 'store':
+    data = open_store('chicago_housing_all_residential.csv', cha.read_cleaned_csv, cha.CLEANING_VERSION)
+    names = data.names
+else:
+    data = RegionIndex(load_cleaned('chicago_housing_all_residential.csv', cha.read_cleaned_csv, cha.CLEANING_VERSION))
+    names = data.names
+opened = time.perf_counter()
+for name in names:
+    cha.area_ppsf_by_yr(data, name)
+    cha.monthly_unit_sold_yr(data, name)
+done = time.perf_counter()
+private = 0
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+            private += int(line.split()[1])
+print(opened - start, (done - opened) / (2 * len(names)), private)
+'''
+
+
+def main(workers=4):
+
+    workers = int(workers)
+    open_store('chicago_housing_all_residential.csv', cha.read_cleaned_csv, cha.CLEANING_VERSION)  # build once
+
+    for mode in ('frame', 'store'):
+        procs = [subprocess.Popen([sys.executable, '-c', PROBE, mode], stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+        rows = [[float(v) for v in p.communicate()[0].split()] for p in procs]
+        opened = max(r[0] for r in rows)
+        query = sum(r[1] for r in rows) / len(rows)
+        private = sum(r[2] for r in rows) / 1024
+        print('{:<6} {} workers  start-up {:.3f} s  {:.1f} us/query  {:.1f} MB private in total'.format(
+            mode, workers, opened, query * 1e6, private))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,28 @@
+# bench_compact.py
+# Bytes per row of the cleaned frame before and after compact mode.
+# Run from the repository root:  python -m benchmarks.bench_compact
+
+
+import sys
+
+import pandas as pd
+
+from chicago_housing_analysis import bytes_per_row, df_cleaning, read_cleaned_csv
+
+
+def main(filenm='chicago_housing_all_residential.csv'):
+
+    frames = [
+        ('untyped read_csv', df_cleaning(pd.read_csv(filenm, sep=','))),
+        ('schema read', read_cleaned_csv(filenm)),
+        ('compact', read_cleaned_csv(filenm, compact=True)),
+    ]
+    base = bytes_per_row(frames[0][1])
+    for label, df in frames:
+        per_row = bytes_per_row(df)
+        print('{:<18} {:>3} columns {:>8.1f} bytes/row  ({:.1f}x smaller)'.format(
+            label, len(df.columns), per_row, base / per_row))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,38 @@
+# bench_forecast.py
+# Scaling of the batched seasonal trend forecast with the number of regions, on synthetic
+# exports holding more and more metros.
+# Run from the repository root:  python -m benchmarks.bench_forecast [max_scale] [repeat]
+
+
+import sys
+import time
+
+import chicago_housing_analysis as cha
+import housing_memo
+from region_forecast import forecast_regions
+from benchmarks.synthetic import synthetic_frame
+
+
+def main(max_scale=32, repeat=3):
+
+    max_scale, repeat = int(max_scale), int(repeat)
+    scale, base = 1, None
+    while scale <= max_scale:
+        df = cha.df_cleaning(synthetic_frame(scale))
+        best = float('inf')
+        for _ in range(repeat):
+            housing_memo.clear()  # time the Region x Period layout along with the fit
+            start = time.perf_counter()
+            forecast = forecast_regions(df)
+            best = min(best, time.perf_counter() - start)
+
+        regions = len(forecast['ppsf'])
+        per_region = best / regions * 1e6
+        base = base or per_region
+        print('{:>3}x {:>6} regions {:>8.3f} s {:>8.1f} us/region  ({:.2f}x the 1x cost per region)'.format(
+            scale, regions, best, per_region, per_region / base))
+        scale *= 2
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
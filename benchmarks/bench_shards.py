@@ -0,0 +1,35 @@
+# bench_shards.py
+# Scaling of the sharded run with the number of worker processes on a synthetic multi-metro
+# export.
+# Run from the repository root:  python -m benchmarks.bench_shards [metros]
+
+
+import os
+import sys
+import tempfile
+import time
+
+from housing_shards import run_sharded
+from benchmarks.synthetic import write_synthetic_csv
+
+
+def main(metros=16):
+
+    metros = int(metros)
+    with tempfile.TemporaryDirectory() as tmp:
+        filenm = os.path.join(tmp, 'national.csv')
+        write_synthetic_csv(metros, filenm)
+
+        counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+        base = None
+        for workers in counts:
+            start = time.perf_counter()
+            merged = run_sharded(filenm, workers=workers)
+            wall = time.perf_counter() - start
+            base = base or wall
+            print('{:>3} workers {:>8.2f} s  {:>5.2f}x  ({} shards, {:.2f} s of shard work)'.format(
+                workers, wall, base / wall, len(merged['shard_timing']), merged['shard_timing']['total_s'].sum()))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
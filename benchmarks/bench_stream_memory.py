@@ -0,0 +1,54 @@
+# bench_stream_memory.py
+# Peak memory of the full in-memory load against the chunked streaming pipeline, on synthetic
+# files 1x, 4x and 16x the size of the residential CSV. Streaming runs both on the side regions
+# and on every region, whose Ppsf readings are all kept for the medians.
+# Run from the repository root:  python -m benchmarks.bench_stream_memory
+
+
+import os
+import tempfile
+import tracemalloc
+
+from chicago_housing_analysis import monthly_sale_share, read_cleaned_csv
+from housing_stream import stream_aggregates
+from region_index import RegionIndex
+from region_matrix import region_year_metrics
+
+from benchmarks.synthetic import SIDE_LIST, write_synthetic_csv
+
+
+def peak_mb(func, *args, **kwargs):
+    """Return the peak traced allocation of one call, in MB."""
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return peak / 2 ** 20
+
+
+def full_load(filenm):
+    df = read_cleaned_csv(filenm)
+    region_year_metrics(RegionIndex(df), SIDE_LIST)
+    monthly_sale_share(df, range(1, 13))
+
+
+def main(source='chicago_housing_all_residential.csv', chunksize=20000):
+
+    tmp = tempfile.mkdtemp()
+    print('{:>6} {:>10} {:>14} {:>14} {:>14}'.format('scale', 'file MB', 'full load MB', 'streaming MB',
+                                                     'all regions MB'))
+    for scale in (1, 4, 16):
+        filenm = os.path.join(tmp, 'scaled_{}.csv'.format(scale))
+        write_synthetic_csv(scale, filenm, source)
+        full = peak_mb(full_load, filenm)
+        stream = peak_mb(stream_aggregates, filenm, SIDE_LIST, chunksize=chunksize)
+        every = peak_mb(stream_aggregates, filenm, None, chunksize=chunksize)
+        size = os.path.getsize(filenm) / 2 ** 20
+        print('{:>5}x {:>10.1f} {:>14.1f} {:>14.1f} {:>14.1f}'.format(scale, size, full, stream, every))
+        os.remove(filenm)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# load_test.py
+# Concurrent load test of housing_server reporting p50/p99 latency.
+# Run from the repository root:  python -m benchmarks.load_test [--url http://127.0.0.1:8590]
+# Without --url a server on the residential CSV is started in this process.
+
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from chicago_housing_analysis import read_cleaned_csv
+from housing_server import make_server
+
+
+QUERIES = [
+    ('area_ppsf_by_yr', {'region': 'Chicago, IL - Logan Square'}),
+    ('area_ppsf_by_yr', {'region': 'Chicago, IL'}),
+    ('monthly_unit_sold_yr', {'region': 'Chicago, IL'}),
+    ('season_activity', {'region': 'Chicago, IL'}),
+    ('monthly_sale_share', {'months': '5,6,7'}),
+    ('regions', {}),
+]
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        json.load(response)
+
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Load test the housing query server')
+    parser.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    server = None
+    base = args.url
+    if base is None:
+        server = make_server(read_cleaned_csv('chicago_housing_all_residential.csv'), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:{}'.format(server.server_port)
+
+    urls = ['{}/{}?{}'.format(base, path, urllib.parse.urlencode(query))
+            for path, query in QUERIES]
+    urls = [urls[i % len(urls)] for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        latencies = np.array(list(pool.map(timed_get, urls))) * 1000
+    elapsed = time.perf_counter() - start
+
+    print('{} requests, concurrency {}: {:.0f} req/s'.format(len(urls), args.concurrency, len(urls) / elapsed))
+    print('p50 {:.2f} ms  p99 {:.2f} ms  max {:.2f} ms'.format(
+        np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max()))
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# suite.py
+# Times every analysis and plot function on synthetic data at several scales, keeps a JSON
+# history of the runs and flags regressions against a stored baseline.
+# Run from the repository root:  python -m benchmarks.suite [--scales 1,10,100] [--save-baseline]
+#                                 [--output-dir DIR]
+
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import chicago_housing_analysis as cha
+import housing_memo
+from chart_render import RenderPool
+from mortgage_alignment import read_mortgage_csv
+from region_bootstrap import bootstrap_intervals
+from region_forecast import forecast_regions
+from region_index import RegionIndex
+from region_matrix import region_month_share
+from region_rank import rank_regions
+from region_rolling import rolling_metrics
+from region_tree import region_rollup
+
+from benchmarks.synthetic import SIDE_LIST, synthetic_frame
+
+
+# timings are machine specific, so the history and the baseline stay out of version control
+OUTPUT_DIR = os.path.join('benchmarks', 'results')
+HISTORY = 'history.json'
+BASELINE = 'baseline.json'
+COLORS = ['firebrick', 'pink', 'green', 'lawngreen', 'olive', 'skyblue', 'purple', 'yellow', 'orange', 'navy']
+
+
+def cases(raw, out_dir, export):
+    """Return the (name, function) pairs to benchmark on one synthetic raw dataframe. The
+    analysis inputs are computed once up front so every case times only its own function."""
+
+    df = cha.df_cleaning(raw.copy())
+    regions = RegionIndex(df)
+    df_mort = read_mortgage_csv('MORTGAGE30US.csv')
+    ppsf = cha.mult_area_ppsf_by_yr(regions, SIDE_LIST)
+    perc = cha.mult_area_perc_by_yr(regions, SIDE_LIST)
+    chi_data = cha.season_activity(regions, 'Chicago, IL')
+    share = cha.monthly_sale_share(regions, range(1, 13))
+    units = cha.monthly_unit_sold_yr(regions, 'Chicago, IL')
+    chi_ppsf = cha.area_ppsf_by_yr(regions, 'Chicago, IL')
+
+    def plot(func, *args):
+        # without export the figures are only built and serialised, never written
+        def run():
+            renderer = RenderPool(workers=0, manifest=os.devnull)  # no manifest, nothing is skipped
+            func(*args, renderer=renderer)
+            if export:
+                renderer.render()
+        return run
+
+    def out(name):
+        return os.path.join(out_dir, name)
+
+    return [
+        ('df_cleaning', lambda: cha.df_cleaning(raw.copy())),
+        ('area_ppsf_by_yr', lambda: cha.area_ppsf_by_yr(df, 'Chicago, IL')),
+        ('mult_area_ppsf_by_yr', lambda: cha.mult_area_ppsf_by_yr(df, SIDE_LIST)),
+        ('mult_area_perc_by_yr', lambda: cha.mult_area_perc_by_yr(df, SIDE_LIST)),
+        ('season_activity', lambda: cha.season_activity(df, 'Chicago, IL')),
+        ('monthly_sale_share', lambda: cha.monthly_sale_share(df, range(1, 13))),
+        ('region_month_share', lambda: region_month_share(df, years=(2013, 2018))),
+        ('region_month_share deoverlap', lambda: region_month_share(df, years=(2013, 2018), deoverlap=True)),
+        ('region_rollup', lambda: region_rollup(df)),
+        ('rank_regions', lambda: rank_regions(df, 'ppsf', k=8)),
+        ('rolling_metrics', lambda: rolling_metrics(df)),
+        ('bootstrap_intervals', lambda: bootstrap_intervals(df, resamples=1000)),
+        ('forecast_regions', lambda: forecast_regions(df)),
+        ('monthly_unit_sold_yr', lambda: cha.monthly_unit_sold_yr(df, 'Chicago, IL')),
+        ('ppsf_by_yr_plot', plot(cha.ppsf_by_yr_plot, ppsf, COLORS, 'title', out('fig1.png'))),
+        ('perc_by_yr_plot', plot(cha.perc_by_yr_plot, perc, COLORS, 'title', out('fig'))),
+        ('season_by_month_plot', plot(cha.season_by_month_plot, chi_data, COLORS[:2], 'title', out('fig'))),
+        ('monthly_sale_share_plot', plot(cha.monthly_sale_share_plot, share, 'title', out('fig_share.png'))),
+        ('monthly_unit_sold_yr_plot', plot(cha.monthly_unit_sold_yr_plot, units, 'title', out('fig_sale.png'))),
+        ('mort_vs_mppsf_plot', plot(cha.mort_vs_mppsf_plot, chi_ppsf, df_mort, 'title', out('fig_mortgage.png'))),
+    ]
+
+
+def measure(func, repeat):
+    """Return (best wall seconds over repeat runs, peak traced MB of one extra run). The
+    aggregation cache is emptied before every run so cold computations are timed."""
+
+    best = float('inf')
+    for _ in range(repeat):
+        housing_memo.clear()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    housing_memo.clear()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak / 2 ** 20
+
+
+IMPORT_PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import chicago_housing_analysis
+seconds = time.perf_counter() - start
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'plotly' in sys.modules)
+"""
+
+
+def cold_import(repeat):
+    """Time importing chicago_housing_analysis in fresh interpreters.
+
+    :return: (best seconds, peak RSS MB of the interpreter, whether plotly got imported)
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], capture_output=True, text=True,
+                             check=True).stdout.split()
+        best = min(best, float(out[0]))
+
+    return best, float(out[1]), out[2] == 'True'
+
+
+def run_suite(scales, repeat, export):
+    """Run every case at every scale, after timing the cold import of the analysis module.
+
+    :return: dictionary of 'name@scale' to {'seconds': ..., 'peak_mb': ...}
+    """
+
+    seconds, peak, plotly_loaded = cold_import(repeat)
+    results = {'cold_import': {'seconds': seconds, 'peak_mb': peak}}
+    print('{:<34} {:>10.4f} s {:>10.1f} MB{}'.format('cold_import', seconds, peak,
+                                                     '  (plotly imported!)' if plotly_loaded else ''))
+    out_dir = tempfile.mkdtemp()
+    for scale in scales:
+        raw = synthetic_frame(scale)
+        for name, func in cases(raw, out_dir, export):
+            seconds, peak = measure(func, repeat)
+            results['{}@{}x'.format(name, scale)] = {'seconds': seconds, 'peak_mb': peak}
+            print('{:<34} {:>10.4f} s {:>10.1f} MB'.format('{} @ {}x'.format(name, scale), seconds, peak))
+
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Return the cases whose time or peak memory grew by more than tolerance (a fraction)
+    against the baseline, as (case, metric, baseline value, new value) tuples."""
+
+    found = []
+    for case, new in results.items():
+        old = baseline.get(case)
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if new[metric] > old[metric] * (1 + tolerance):
+                found.append((case, metric, old[metric], new[metric]))
+
+    return found
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', default='1,10,100', help='comma separated data scales')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (best is kept)')
+    parser.add_argument('--no-export', action='store_true', help='build the figures but skip image export')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before flagging')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='directory of the run history and the baseline')
+    args = parser.parse_args(argv)
+
+    scales = [int(x) for x in args.scales.split(',')]
+    results = run_suite(scales, args.repeat, not args.no_export)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    history_path = os.path.join(args.output_dir, HISTORY)
+    baseline_path = os.path.join(args.output_dir, BASELINE)
+
+    history = load_json(history_path, [])
+    history.append({'time': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                    'results': results})
+    with open(history_path, 'w') as f:
+        json.dump(history, f, indent=1)
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        return 0
+
+    found = regressions(results, load_json(baseline_path, {}), args.tolerance)
+    for case, metric, old, new in found:
+        print('REGRESSION {} {}: {:.4f} -> {:.4f}'.format(case, metric, old, new))
+
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
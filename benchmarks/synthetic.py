@@ -0,0 +1,52 @@
+# synthetic.py
+# Synthetic Redfin shaped data, generated from the schema and values of the real CSV.
+
+
+import numpy as np
+import pandas as pd
+
+from chicago_housing_analysis import COLUMN_SCHEMA
+
+
+SOURCE = 'chicago_housing_all_residential.csv'
+SIDE_LIST = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side',
+             'Chicago, IL - Far Southeast Side', 'Chicago, IL - Far Southwest Side', 'Chicago, IL - North Side',
+             'Chicago, IL - Northwest Side', 'Chicago, IL - South Side', 'Chicago, IL - Southwest Side',
+             'Chicago, IL - West Side']
+
+
+def synthetic_frame(scale, source=SOURCE, seed=0):
+    """Return an uncleaned dataframe scale times the size of the source CSV, read with the
+    same dtypes. Copy i of the data is moved to a made up metro ('Metro i, US ...') and its
+    Median Sale Ppsf and Homes Sold are jittered, so larger scales look like more metros in
+    the nationwide export rather than duplicated rows.
+
+    :param scale: number of copies of the source rows
+    :param source: path of the real Redfin CSV
+    :param seed: seed of the jitter
+    :return: dataframe ready for df_cleaning
+    """
+
+    df = pd.read_csv(source, sep=',', dtype=COLUMN_SCHEMA)
+    rng = np.random.default_rng(seed)
+
+    copies = [df]
+    for i in range(1, scale):
+        copy = df.copy()
+        copy['Region'] = copy['Region'].cat.rename_categories(
+            lambda name: name.replace('Chicago, IL', 'Metro {}, US'.format(i)))
+        copy['Median Sale Ppsf'] = copy['Median Sale Ppsf'] * rng.uniform(0.5, 2.0)
+        copy['Homes Sold'] = (copy['Homes Sold'] * rng.uniform(0.5, 2.0)).round().astype('int32')
+        copies.append(copy)
+
+    df = pd.concat(copies, ignore_index=True)
+    for col in ('Region', 'Property Type', 'Median Sale Price', 'Period Begin', 'Period End'):
+        df[col] = df[col].astype('category')  # concat of differing categories falls back to object
+
+    return df
+
+
+def write_synthetic_csv(scale, filenm, source=SOURCE, seed=0):
+    """Write synthetic_frame to a CSV in the Redfin export format."""
+
+    synthetic_frame(scale, source, seed).to_csv(filenm, index=False)
@@ -0,0 +1,163 @@
+# chart_render.py
+# Collects plotly figures and exports them as images concurrently.
+
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+MANIFEST = '.render_manifest.json'
+WORKERS_ENV = 'HOUSING_RENDER_WORKERS'
+
+
+def spec_hash(spec, filenm):
+    """Return the hash identifying a figure spec written to a given file.
+
+    >>> spec_hash('{"data": []}', 'a.png') == spec_hash('{"data": []}', 'a.png')
+    True
+    >>> spec_hash('{"data": []}', 'a.png') == spec_hash('{"data": []}', 'b.png')
+    False
+    """
+
+    return hashlib.sha256((filenm + '\n' + spec).encode('utf-8')).hexdigest()
+
+
+def _init_worker():
+    """Import plotly once per worker process; the image exporter then stays warm for every
+    figure the worker renders."""
+
+    import plotly.io  # noqa: F401
+
+
+def _render(spec, filenm):
+    """Rebuild a figure from its JSON spec and write it to filenm."""
+
+    import plotly.io as pio
+
+    pio.from_json(spec).write_image(filenm)
+
+    return filenm
+
+
+class RenderPool:
+    """Collects figures from the *_plot functions and writes them as images across a pool of
+    worker processes. A figure is skipped when its spec hash matches the one recorded in the
+    manifest for the same file on the last run and the file still exists.
+
+    :param workers: number of exporter processes (defaults to the HOUSING_RENDER_WORKERS
+        environment variable, then the CPU count); 0 renders in this process
+    :param manifest: JSON file recording the spec hash of every file written
+
+    >>> import tempfile
+    >>> tmp = tempfile.mkdtemp()
+    >>> pool = RenderPool(workers=0, manifest=os.path.join(tmp, 'manifest.json'))
+    >>> import plotly.graph_objs as go
+    >>> pool.submit(go.Figure(), os.path.join(tmp, 'fig.png'))
+    True
+    >>> len(pool.pending)
+    1
+    """
+
+    def __init__(self, workers=None, manifest=MANIFEST):
+        if workers is None:
+            workers = int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1))
+        self.workers = workers
+        self.manifest = manifest
+        self.pending = {}
+        self.skipped = []
+        self._executor = None
+
+        try:
+            with open(manifest) as f:
+                self._hashes = json.load(f)
+        except (OSError, ValueError):
+            self._hashes = {}
+
+    def submit(self, fig, filenm):
+        """Queue a figure for export to filenm.
+
+        :param fig: plotly figure
+        :param filenm: output image filename
+        :return: False if the figure is unchanged since the last run and was skipped
+        """
+
+        spec = fig.to_json()
+        key = spec_hash(spec, filenm)
+        if self._hashes.get(filenm) == key and os.path.exists(filenm):
+            self.skipped.append(filenm)
+            return False
+
+        self.pending[filenm] = (spec, key)
+        return True
+
+    def render(self):
+        """Export every queued figure and record their hashes in the manifest. When an export
+        fails, the figures written by the others are still recorded before its error is raised.
+
+        :return: list of the filenames written
+        """
+
+        jobs, self.pending = self.pending, {}
+        if not jobs:
+            return []
+
+        written, errors = [], []
+
+        def collect(result):
+            try:
+                written.append(result())
+            except Exception as exc:
+                errors.append(exc)
+
+        if self.workers == 0:
+            for filenm, (spec, _) in jobs.items():
+                collect(lambda: _render(spec, filenm))
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            futures = [self._executor.submit(_render, spec, filenm) for filenm, (spec, _) in jobs.items()]
+            for f in futures:
+                collect(f.result)
+
+        for filenm in written:
+            self._hashes[filenm] = jobs[filenm][1]
+        with open(self.manifest, 'w') as f:
+            json.dump(self._hashes, f, indent=1, sort_keys=True)
+
+        if errors:
+            raise errors[0]
+
+        return written
+
+    def close(self):
+        """Shut the worker processes down."""
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.render()
+        finally:
+            self.close()
+
+
+def write_figure(fig, filenm, renderer=None):
+    """Write a figure to filenm, or queue it on a RenderPool when one is given.
+
+    :param fig: plotly figure
+    :param filenm: output image filename
+    :param renderer: optional RenderPool
+    """
+
+    if renderer is None:
+        fig.write_image(filenm)
+    else:
+        renderer.submit(fig, filenm)
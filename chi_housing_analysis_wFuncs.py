@@ -1,9 +1,4 @@
-import numpy as np
 import pandas as pd
-from chart_studio.plotly import plot, iplot
-import chart_studio.plotly as py
-import plotly.graph_objs as go
-import plotly.io as pio
 
 
 def main():
@@ -143,6 +138,8 @@ def ppsf_by_yr_plot(df_dict, colors, chart_title, filenm):
 
     color_dict = {dict_keys_list[i]: colors[i] for i in range(len(dict_keys_list))}
 
+    import plotly.graph_objs as go  # plotly is only needed once a chart is drawn
+
     fig = go.Figure()
 
     for i in df_dict.keys():
@@ -160,4 +157,3 @@ def ppsf_by_yr_plot(df_dict, colors, chart_title, filenm):
 
 if __name__ == '__main__':
     main()
-
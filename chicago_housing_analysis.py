@@ -2,62 +2,190 @@
 # student: Joy Liang
 
 
-import pandas as pd
-import plotly.graph_objs as go
-from plotly.subplots import make_subplots
-
-
-def main():
-
-    # read file
-    df_all = pd.read_csv('chicago_housing_all_residential.csv', sep=',')
-    df_all = df_cleaning(df_all)
-
-    df_mort = pd.read_csv('MORTGAGE30US.csv', sep=',')
-    df_mort['DATE'] = pd.to_datetime(df_mort['DATE'])
+import argparse
+import os
 
-    side_list = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side',
-                 'Chicago, IL - Far Southeast Side', 'Chicago, IL - Far Southwest Side', 'Chicago, IL - North Side',
-                 'Chicago, IL - Northwest Side', 'Chicago, IL - South Side', 'Chicago, IL - Southwest Side',
-                 'Chicago, IL - West Side']
-    df_by_side = mult_area_ppsf_by_yr(df_all, side_list)
-    perc_by_area = mult_area_perc_by_yr(df_all, side_list)
-
-    side_color_list = ['firebrick', 'pink', 'green', 'lawngreen', 'olive', 'skyblue', 'purple', 'yellow',
-                       'orange', 'navy']
-    ppsf_by_yr_plot(df_by_side, side_color_list, 'Median Sale Price Psf in Chicago (by side)', filenm='fig1.png')
-    perc_by_yr_plot(perc_by_area, side_color_list, '% Change of House Price in Chicago (by side)', filenm='fig')
-
-    comm_list = ['Chicago, IL - Near North Side', 'Chicago, IL - The Loop', 'Chicago, IL - Near South Side',
-                 'Chicago, IL - North Center', 'Chicago, IL - Lake View', 'Chicago, IL - Lincoln Park',
-                 'Chicago, IL - Avondale', 'Chicago, IL - Logan Square']
-    df_by_comm = mult_area_ppsf_by_yr(df_all, comm_list)
-    perc_by_area = mult_area_perc_by_yr(df_all, comm_list)
-
-    comm_color_list = ['pink', 'green', 'lawngreen', 'skyblue', 'orange', 'darkred', 'gray', 'navy']
-    ppsf_by_yr_plot(df_by_comm, comm_color_list, 'The Most Expensive Communities in Chicago', filenm='fig2.png')
-    perc_by_yr_plot(perc_by_area, comm_color_list, '% Change of House Price in Chicago (Community)', filenm='fig')
+import numpy as np
+import pandas as pd
 
-    # store seasonal activity data
-    chi_data = season_activity(df_all, 'Chicago, IL')
-    season_color_list = ['orange', 'lightblue']
-    season_by_month_plot(chi_data, season_color_list, 'Seasonal Activity', filenm='fig')
+from chart_render import RenderPool
+from column_store import ColumnStore
+from housing_cache import load_cleaned
+from housing_export import FORMATS, export_results
+import housing_incremental
+import housing_profile
+from housing_memo import memoized
+from housing_profile import profiled, stage
+from mortgage_alignment import read_mortgage_csv
+from region_index import RegionIndex, region_rows
+from region_matrix import region_month_share, region_year_matrix, region_year_metrics, year_row
+
+
+# bump whenever df_cleaning changes so cached cleaned frames are rebuilt
+CLEANING_VERSION = '3'
+
+# dtypes of the Redfin export columns, pinned at read time so pandas never has to infer them.
+# Prices and dates repeat heavily, so they are read as categories and only the distinct
+# values get parsed. Counts that can be blank in the national exports are nullable integers.
+COLUMN_SCHEMA = {
+    'Property Type': 'category',
+    'Region': 'category',
+    'Avg Sale To List': 'float32',
+    'Homes Sold': 'Int32',
+    'Inventory': 'Int32',
+    'Median Dom': 'float64',
+    'Median List Ppsf': 'float64',
+    'Median List Price': 'float64',
+    'Median Sale Ppsf': 'float64',
+    'Median Sale Price': 'category',
+    'months_of_supply': 'float32',
+    'New Listings': 'float64',
+    'off_market_in_two_weeks': 'float32',
+    'pending_sales': 'float64',
+    'Period Begin': 'category',
+    'Period Duration': 'int16',
+    'Period End': 'category',
+    'Price Drops': 'float32',
+    'Sold Above List': 'float32',
+}
+DATE_COLUMNS = ['Period Begin', 'Period End']
+DATE_FORMAT = '%m/%d/%Y'
+CURRENCY_SCALE = {'': 1, 'K': 1e3, 'M': 1e6, 'B': 1e9}
+
+# the charts live in housing_plots and are imported on first use, so data-only callers never load plotly
+PLOT_FUNCTIONS = ('ppsf_by_yr_plot', 'perc_by_yr_plot', 'season_by_month_plot', 'monthly_sale_share_plot',
+                  'monthly_unit_sold_yr_plot', 'mort_vs_mppsf_plot', 'ranking_plot')
+
+# columns the analysis actually reads; compact mode drops every other one at read time
+COMPACT_COLUMNS = ['Property Type', 'Region', 'Homes Sold', 'Median Sale Ppsf', 'Median Sale Price',
+                   'Period Begin', 'Period Duration', 'Period End']
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Chicago housing market analysis')
+    parser.add_argument('--spec', metavar='PATH', action='append',
+                        help='JSON or TOML report spec; repeat to build several reports in one job '
+                             '(default reports/default.json)')
+    parser.add_argument('--profile', action='store_true',
+                        help='write a per-stage run report (also enabled by HOUSING_PROFILE=1)')
+    parser.add_argument('--profile-stage', metavar='NAME',
+                        help='run one named stage under cProfile and tracemalloc')
+    parser.add_argument('--no-plots', action='store_true', help='data only: skip the charts and plotly entirely')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fold only the rows appended to the CSV since the last run into the persisted '
+                             'yearly aggregates and rows, and never hash or parse the whole CSV')
+    parser.add_argument('--export-dir', metavar='DIR', help='write the aggregates as data files to DIR')
+    parser.add_argument('--export-format', choices=FORMATS, default='csv', help='format of the exported aggregates')
+    args = parser.parse_args(argv)
+    if args.profile or args.profile_stage:
+        housing_profile.enable(capture=args.profile_stage)
+
+    import housing_report
+    specs = [housing_report.load_spec(path) for path in args.spec or [housing_report.DEFAULT_SPEC]]
+
+    # reports reading the same files share one load and one plan
+    by_input = {}
+    for spec in specs:
+        files = spec.get('input', {})
+        key = (files.get('housing', 'chicago_housing_all_residential.csv'), files.get('mortgage', 'MORTGAGE30US.csv'))
+        by_input.setdefault(key, []).append(spec)
+
+    for (housing_csv, mortgage_csv), input_specs in by_input.items():
+        # incremental runs fold the rows appended since the last run into the yearly matrices and
+        # the stored rows; the per-region analyses then read those rows instead of the CSV
+        matrices = None
+        if args.incremental:
+            with stage('refresh') as record:
+                matrices = housing_incremental.refresh(housing_csv, read_cleaned_csv, CLEANING_VERSION)
+                if record is not None:
+                    record.set_rows_out(matrices['ppsf'])
+
+        regions = None
+        plan = housing_report.plan_reports(input_specs)
+        if matrices is None or plan['calls'] or plan['rollups']:
+            # cleaned frame: the rows refresh stored, or the CSV cached on disk until it or the cleaning changes
+            with stage('load') as record:
+                if args.incremental:
+                    df_all = housing_incremental.stored_rows(housing_incremental.state_path(housing_csv))
+                else:
+                    df_all = load_cleaned(housing_csv, read_cleaned_csv, CLEANING_VERSION)
+                regions = RegionIndex(df_all)  # shared by every per-region analysis below
+                if record is not None:
+                    record.set_rows_out(df_all)
+
+        reports = housing_report.run_reports(regions, input_specs, matrices)
+        for spec in input_specs:
+            results = reports[spec['name']]
+            if args.export_dir:
+                out_dir = args.export_dir if len(specs) == 1 else os.path.join(args.export_dir, spec['name'])
+                with stage('export') as record:
+                    written = export_results(results, out_dir, args.export_format)
+                    if record is not None:
+                        record.add_output(written)
+            if not args.no_plots:
+                plot_aggregates(results, read_mortgage_csv(mortgage_csv), spec)
+
+    if housing_profile.REPORT.enabled:
+        housing_profile.REPORT.write()
+        print(housing_profile.REPORT.summary())
+
+
+def plot_aggregates(results, df_mort, spec=None):
+    """Chart the results of compute_aggregates. Plotly is only imported from here on.
+
+    :param results: dictionary returned by compute_aggregates
+    :param df_mort: dataframe of 30-year fixed mortgage rate in US
+    :param spec: report spec the results were computed for (default reports/default.json)
+    :return: No explicit return. Final result is outputted to file.
+    """
 
-    # store percentage of monthly sale data
-    month_lst = list(range(1, 13))
-    month_sale_share = monthly_sale_share(df_all, month_lst)
-    monthly_sale_share_plot(month_sale_share, 'Share of Homes Sale in Unit by Month', filenm='fig_share.png')
+    import housing_report
+    if spec is None:
+        spec = housing_report.load_spec()
+
+    # charts are queued here and exported concurrently at the end; the pool is shut down
+    # even when a chart fails
+    with RenderPool() as renderer:
+        housing_report.chart_report(results, spec, df_mort, renderer=renderer)
+
+        # export every queued chart, skipping the ones unchanged since the last run
+        with stage('render') as record:
+            written = renderer.render()
+            if record is not None:
+                record.add_output(written)
+
+
+def compute_aggregates(df, spec=None):
+    """Run every analysis of a report spec and return the results by output name. The
+    aggregations are planned together, so a region or metric shared by several outputs is
+    computed once.
+
+    :param df: The specific dataframe imported in the main function, or a RegionIndex built on it
+    :param spec: report spec (default reports/default.json)
+    :return: dictionary of result name to the analysis output
+
+    >>> import housing_memo
+    >>> housing_memo.clear()
+    >>> regions = RegionIndex(read_cleaned_csv('chicago_housing_all_residential.csv'))
+    >>> results = compute_aggregates(regions)
+    >>> sorted(results)[:3]
+    ['chicago_ppsf_by_yr', 'monthly_sale_share', 'monthly_unit_sold_yr']
+    >>> housing_memo.cache_info().misses  # one Region x Year pass plus two per-region analyses
+    3
+    >>> results = compute_aggregates(regions)  # a second report on the same data is all cache hits
+    >>> housing_memo.cache_info().misses
+    3
+    """
 
-    # store average monthly unit sold each year data
-    unit_sold_monthly_yr = monthly_unit_sold_yr(df_all, 'Chicago, IL')
-    monthly_unit_sold_yr_plot(unit_sold_monthly_yr, 'Avg Monthly Unit Sold from 2012 - 2019 in Chicago, IL',
-                              filenm='fig_sale.png')
+    import housing_report
+    if spec is None:
+        spec = housing_report.load_spec()
 
-    # store mortgage rate and median sale Ppsf data
-    df_chi = area_ppsf_by_yr(df_all, 'Chicago, IL')
-    mort_vs_mppsf_plot(df_chi, df_mort, 'Mortgage Rate vs. House Price in Chicago', filenm='fig_mortgage.png')
+    return housing_report.run_report(df, spec)
 
 
+@profiled
 def df_cleaning(df):
     """Before analysis, data needs to be cleaned up as necessary. Put all data cleaning
     steps here for organization.
@@ -83,23 +211,139 @@ def df_cleaning(df):
     if not isinstance(df, pd.DataFrame):
         raise ValueError('Input must be a dataframe.')
 
-    df['Median Sale Price'] = [x[1:] for x in df['Median Sale Price'].str.replace('K', '000')]
-    df['Median Sale Price'] = df['Median Sale Price'].str.replace(',', '')
-    df['Median Sale Price'] = pd.to_numeric(df['Median Sale Price'])
-    df['Period Begin'] = pd.to_datetime(df['Period Begin'])
-    df['Period End'] = pd.to_datetime(df['Period End'])
+    df['Median Sale Price'] = parse_currency(df['Median Sale Price'])
+    for col in DATE_COLUMNS:
+        df[col] = parse_dates(df[col])
     df['Month'] = df['Period Begin'].dt.month
     df['Year'] = df['Period Begin'].dt.year
-    # df.head(15)
 
     return df
 
 
+def parse_currency(prices):
+    """Turn Redfin currency strings such as $275K, $1.2M or $1,250 into numbers with one
+    vectorized regex pass over the distinct values.
+
+    :param prices: series of currency strings
+    :return: series of floats (NaN where a value can't be parsed)
+
+    >>> parse_currency(pd.Series(['$275K', '$1.2M', '$1,250', '$275K'])).tolist()
+    [275000.0, 1200000.0, 1250.0, 275000.0]
+    """
+
+    def parse(values):
+        parts = values.astype(str).str.replace(',', '', regex=False).str.extract(r'^\$?([\d.]+)\s*([KMB]?)$')
+        return pd.to_numeric(parts[0], errors='coerce') * parts[1].map(CURRENCY_SCALE)
+
+    return _parse_distinct(prices, lambda cats: pd.Index(parse(cats.to_series())), np.nan)
+
+
+def parse_dates(dates):
+    """Parse Redfin dates with the fixed DATE_FORMAT, converting each distinct date once.
+
+    :param dates: series of date strings
+    :return: series of datetime64 values
+
+    >>> parse_dates(pd.Series(['1/1/2012', '3/31/2012', '1/1/2012'])).dt.day.tolist()
+    [1, 31, 1]
+    """
+
+    return _parse_distinct(dates, lambda cats: pd.to_datetime(cats, format=DATE_FORMAT), pd.NaT)
+
+
+def _parse_distinct(values, parse, missing):
+    """Apply parse to the categories of values and broadcast the result back to every row."""
+
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    parsed = parse(values.cat.categories)
+    parsed = parsed.take(values.cat.codes.to_numpy(), allow_fill=True, fill_value=missing)
+
+    return pd.Series(parsed, index=values.index, name=values.name)
+
+
+def read_cleaned_csv(filenm, compact=False):
+    """Read a Redfin CSV with the dtypes declared in COLUMN_SCHEMA and clean it.
+
+    :param filenm: path of the CSV
+    :param compact: only read COMPACT_COLUMNS and downcast the numbers (see compact_frame)
+    :return: the cleaned dataframe
+
+    >>> df_all = read_cleaned_csv('chicago_housing_all_residential_test.csv')
+    >>> len(df_all)
+    6
+    >>> df_compact = read_cleaned_csv('chicago_housing_all_residential_test.csv', compact=True)
+    >>> bytes_per_row(df_compact) < bytes_per_row(df_all)
+    True
+
+    Blank Homes Sold cells, as in the national exports, are read as missing and the average
+    units stay floats:
+
+    >>> import io
+    >>> raw = pd.read_csv('chicago_housing_all_residential_test.csv', dtype=str)
+    >>> raw.loc[raw['Region'] == 'Chicago, IL - Southwest Side', 'Homes Sold'] = None
+    >>> df_blank = read_cleaned_csv(io.StringIO(raw.to_csv(index=False)))
+    >>> str(df_blank['Homes Sold'].dtype), int(df_blank['Homes Sold'].isna().sum())
+    ('Int32', 2)
+    >>> units = region_year_matrix(df_blank, 'units')
+    >>> str(units.dtypes.unique()[0]), units.loc['Chicago, IL', 2014]
+    ('float64', 1724.0)
+    """
+
+    if not compact:
+        return df_cleaning(pd.read_csv(filenm, sep=',', dtype=COLUMN_SCHEMA))
+
+    dtype = {col: COLUMN_SCHEMA[col] for col in COMPACT_COLUMNS}
+    df = pd.read_csv(filenm, sep=',', usecols=COMPACT_COLUMNS, dtype=dtype)
+
+    return compact_frame(df_cleaning(df))
+
+
+def compact_frame(df):
+    """Downcast the numeric columns of a cleaned dataframe to the smallest dtype holding
+    their values (float32, int16, ...) and store Region and Property Type as categories.
+
+    :param df: cleaned dataframe
+    :return: the same dataframe with compact dtypes
+
+    >>> df_all = compact_frame(read_cleaned_csv('chicago_housing_all_residential_test.csv'))
+    >>> str(df_all['Median Sale Ppsf'].dtype), str(df_all['Homes Sold'].dtype), str(df_all['Year'].dtype)
+    ('float32', 'Int16', 'int16')
+    """
+
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col in ('Region', 'Property Type'):
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_float_dtype(dtype):
+            df[col] = pd.to_numeric(df[col], downcast='float')
+        elif pd.api.types.is_integer_dtype(dtype):
+            df[col] = pd.to_numeric(df[col], downcast='integer')  # nullable integers stay nullable
+
+    return df
+
+
+def bytes_per_row(df):
+    """Return the in-memory bytes per row of a dataframe, counting string contents.
+
+    :param df: dataframe to measure
+    :return: bytes per row (0 for an empty dataframe)
+    """
+
+    if len(df) == 0:
+        return 0
+
+    return df.memory_usage(deep=True).sum() / len(df)
+
+
+@profiled
+@memoized
 def area_ppsf_by_yr(df, region):
     """Returns medium sale price per square foot by year, given the residential dataframe and
     specified region.
 
-    :param df: The specific dataframe imported in the main function
+    :param df: The specific dataframe imported in the main function, a RegionIndex built on it, or a
+        ColumnStore of it
     :param region: Specified region/area/community
     :return: a dataframe reflecting the specified region's medium sale ppsf by year
 
@@ -110,17 +354,20 @@ def area_ppsf_by_yr(df, region):
     98.43043363
     """
 
-    area_data = df[df['Region'] == region]  # get area information
-    area_data_by_yr = area_data.groupby(area_data['Year'])['Median Sale Ppsf'].median()
+    if isinstance(df, ColumnStore):
+        return df.year_median(region, 'Median Sale Ppsf')  # medians over the memory mapped slice
+
+    ppsf = region_year_matrix(df, 'ppsf')  # get area information, read off the cached matrix
 
-    return area_data_by_yr
+    return year_row(ppsf, region, name='Median Sale Ppsf')
 
 
+@profiled
 def mult_area_ppsf_by_yr(df, region_list):
-    """Given a list of regions, loop through and return medium sale price per square foot by year
-    for all the specified regions on the list.
+    """Given a list of regions, return medium sale price per square foot by year for all the
+    specified regions on the list, read off one Region x Year matrix.
 
-    :param df: The specific dataframe imported in the main function
+    :param df: The specific dataframe imported in the main function, or a RegionIndex built on it
     :param region_list: A list of specified regions/areas/communities
     :return: A dictionary reflecting the list of regions and its corresponding medium sale ppsf by year
 
@@ -132,61 +379,23 @@ def mult_area_ppsf_by_yr(df, region_list):
     True
     """
 
+    ppsf = region_year_matrix(df, 'ppsf')  # one grouped pass for every region, cached
+
     # initialize a dictionary for regions and its corresponding median sale ppsf by year
     area_price_dict = {}
     for i in region_list:
-        yr_ppsf = area_ppsf_by_yr(df, i)  # get year and its corresponding Median Sale Ppsf
+        yr_ppsf = year_row(ppsf, i, name='Median Sale Ppsf')  # get year and its corresponding Median Sale Ppsf
         area_price_dict.update({i: yr_ppsf})
 
     return area_price_dict
 
 
-def ppsf_by_yr_plot(df_dict, colors, chart_title, filenm):
-    """ Plot out medium sale ppsf by year for each specified region in
-    the specified dataframe.
-
-    :param df_dict: dictionary of medium ppsf data by region
-    :param colors: a list of colors to be graphed for each region
-    (Should be same length as number of regions in the dataframe)
-    :param chart_title: Give the plotted graph a title
-    :param filenm: Chart will be outputted to file.  Give output filename
-    :return: No explicit return. Final result is outputted to file.
-
-    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
-    >>> df_all = df_cleaning(df_all)
-    >>> area_list = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side']
-    >>> df_by_area = mult_area_ppsf_by_yr(df_all, area_list)
-    >>> color_list = ['firebrick', 'pink', 'green', 'black']
-    >>> ppsf_by_yr_plot(df_by_area, color_list, 'title','file.png')
-    Traceback (most recent call last):
-    ValueError: Length of df_dict and colors must be equal.
-    """
-
-    dict_regions_list = list(df_dict.keys())  # region list
-
-    if not len(dict_regions_list) == len(colors):
-        raise ValueError('Length of df_dict and colors must be equal.')
-
-    color_dict = {dict_regions_list[i]: colors[i] for i in range(len(dict_regions_list))}
-
-    fig = go.Figure()
-
-    for i in df_dict.keys():
-        df = df_dict.get(i)  # get values with key as "i"
-        fig.add_trace(go.Scatter(x=df.index, y=df.values,
-                                 name=i, line=dict(color=color_dict.get(i), width=1)))
-
-    # Edit the layout
-    fig.update_layout(title=chart_title, xaxis_title='Year', yaxis_title='Ppsf($)')
-
-    fig.write_image(filenm)
-
-
+@profiled
 def mult_area_perc_by_yr(df, region_list):
-    """Given a list of regions, loop through and return percentage change by year
-    for all the specified regions/communities on the list.
+    """Given a list of regions, return percentage change by year for all the specified
+    regions/communities on the list, read off one Region x Year matrix.
 
-    :param df: The specific dataframe imported in the main function
+    :param df: The specific dataframe imported in the main function, or a RegionIndex built on it
     :param region_list: A list of specified regions/areas/communities
     :return: A dictionary reflecting the list of regions and its corresponding percentage change by year
 
@@ -198,60 +407,23 @@ def mult_area_perc_by_yr(df, region_list):
     True
     """
 
-    # initialize a dictionary for regions and its corresponding median sale ppsf by year
+    metrics = region_year_metrics(df)  # one grouped pass for every region, cached
+
+    # initialize a dictionary for regions and its corresponding percentage change by year
     area_perc_dict = {}
     for i in region_list:
-        yr_ppsf = area_ppsf_by_yr(df, i)  # get year and its corresponding Median Sale Ppsf
-        yr_perc = yr_ppsf.pct_change() * 100
+        yr_perc = year_row(metrics['ppsf_pct'], i, years_from=metrics['ppsf'], name='Median Sale Ppsf')
         area_perc_dict.update({i: yr_perc})
 
     return area_perc_dict
 
 
-def perc_by_yr_plot(df_dict, colors, chart_title, filenm):
-    """ Plot out percentage change by year for each specified regions/community in
-    the specified dataframe.
-
-    :param df_dict: dictionary of percentage change data by region
-    :param colors: a list of colors to be graphed for each region
-    (Should be same length as number of regions in the dataframe)
-    :param chart_title: Give the plotted graph a title
-    :param filenm: Chart will be outputted to file.  Give output filename
-    :return: No explicit return. Final result is outputted to file.
-
-    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
-    >>> df_all = df_cleaning(df_all)
-    >>> area_list = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side']
-    >>> df_by_area = mult_area_perc_by_yr(df_all, area_list)
-    >>> color_list = ['firebrick', 'pink', 'green', 'black']
-    >>> perc_by_yr_plot(df_by_area, color_list, 'title','file.png')
-    Traceback (most recent call last):
-    ValueError: Length of df_dict and colors must be equal.
-    """
-
-    dict_regions_list = list(df_dict.keys())  # region list
-
-    if not len(dict_regions_list) == len(colors):
-        raise ValueError('Length of df_dict and colors must be equal.')
-
-    color_dict = {dict_regions_list[i]: colors[i] for i in range(len(dict_regions_list))}
-
-    for i in df_dict.keys():
-
-        df = df_dict.get(i)
-        fig_perc = go.Figure(data=go.Scatter(x=df.index, y=df.values,
-                                             name=i, line=dict(color=color_dict.get(i), width=1)))
-
-        # Edit the layout
-        fig_perc.update_layout(title_text=chart_title + ' - ' + i, yaxis_title='percentage change (%)')
-
-        fig_perc.write_image(filenm + '_' + i + '.png')
-
-
+@profiled
+@memoized
 def season_activity(df, region):
     """ Return a dataframe including Period End, Median Sale Ppsf and Homes Sold given the region as Chicago, IL.
 
-    :param df: The specific dataframe imported in the main function
+    :param df: The specific dataframe imported in the main function, or a RegionIndex built on it
     :param region:
     :return: a dataframe reflecting the overall Chicago's housing seasonality activity for
     Median Sale Ppsf and Homes Sold
@@ -263,53 +435,23 @@ def season_activity(df, region):
     Timestamp('2014-01-31 00:00:00')
     """
 
-    df_sub = df[['Period End', 'Median Sale Ppsf', 'Homes Sold']][df['Region'] == region]
+    df_sub = region_rows(df, region)[['Period End', 'Median Sale Ppsf', 'Homes Sold']]
     df_sub_by_month = df_sub.set_index('Period End')
 
     return df_sub_by_month
 
 
-def season_by_month_plot(chi_data, colors, bar_title, filenm):
-    """ Plot out seasonality activity by month for Chicago in
-    the specified dataframe.
-
-    :param chi_data: dataframe of seasonality activity for Chicago, IL
-    :param colors: a list of colors to be graphed for each region
-    :param bar_title: Give the plotted graph a title
-    :param filenm: Chart will be outputted to file.  Give output filename
-    :return: No explicit return. Final result is outputted to file.
-
-    >>> df_all = pd.read_csv('chicago_housing_all_residential.csv', sep=',')
-    >>> df_all = df_cleaning(df_all)
-    >>> chi_data = season_activity(df_all, 'Chicago, IL')
-    >>> color_list = ['firebrick', 'pink', 'green']
-    >>> season_by_month_plot(chi_data, color_list, 'title','file.png')
-    Traceback (most recent call last):
-    ValueError: Length of df_dict and colors must be equal.
-    """
-    columns_list = list(chi_data.columns)
-
-    if not len(columns_list) == len(colors):
-        raise ValueError('Length of df_dict and colors must be equal.')
-
-    color_dict = {columns_list[i]: colors[i] for i in range(len(columns_list))}
-
-    for i in columns_list:
-
-        fig_season = go.Figure(data=go.Bar(x=chi_data.index, y=chi_data[i],
-                                           name=i, marker_color=color_dict.get(i)))
-
-        # Edit the layout
-        fig_season.update_layout(title=bar_title + ' - ' + i + ' from 2012 - 2019')
-
-        fig_season.write_image(filenm + '_' + i + '.png')
-
-
-def monthly_sale_share(df, month):
-    """Analyze seasonality per month from 2013 - 2018 because they have full year data. Return the percentage
-     of home sales in unit attributed to a specified month
-     :param df: The specific dataframe imported in the main function
+@profiled
+def monthly_sale_share(df, month, region='Chicago, IL', years=(2013, 2018), per_year=False, deoverlap=False):
+    """Analyze seasonality per month, by default from 2013 - 2018 because they have full year data. Return the
+     percentage of home sales in unit attributed to a specified month, read off the Region x Month share
+     matrix of every region
+     :param df: The specific dataframe imported in the main function, or a RegionIndex built on it
      :param month: from January to December
+     :param region: Specified region/area/community
+     :param years: (first, last) year of sales counted
+     :param per_year: average the shares of the single years instead of pooling the years' sales
+     :param deoverlap: use monthly estimates de-overlapped from the 90 day rolling periods
      :return: a list for the share of the total home sales attributed to a specified month
 
     >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
@@ -319,45 +461,21 @@ def monthly_sale_share(df, month):
     3
      """
 
-    df_sub_chi = df[(df['Year'] > 2012) & (df['Year'] < 2019) & (df['Region'] == 'Chicago, IL')]
-    total_sales = df_sub_chi['Homes Sold'].sum()
-
-    monthly_sale_share_lst = []
-
-    for i in month:
-        share_monthly_sale = df_sub_chi['Homes Sold'].loc[df_sub_chi['Month'] == i].sum()/total_sales
-        monthly_sale_share_lst.append(share_monthly_sale)
-
-    return monthly_sale_share_lst
-
-
-def monthly_sale_share_plot(monthly_share, pie_title, filenm):
-    """ Plot out the share of monthly unit sale for Chicago.
-    :param monthly_share: a list of the share of monthly unit sale for Chicago, IL
-    :param pie_title: Give the plotted graph a title
-    :param filenm: Chart will be outputted to file.  Give output filename
-    :return: No explicit return. Final result is outputted to file.
-    """
-
-    label_months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
-                    'October', 'November', 'December']
-    colors_list = ['#1f77b4', '#ff7f0e', '#9467bd', '#2ca02c', '#d62728', '#e377c2',
-                   '#FDB603', '#639702', '#dacde6', '#faec72', '#9ab973', '#87cefa']
+    share = region_month_share(df, years=tuple(years), per_year=per_year, deoverlap=deoverlap)
+    if region not in share.index:
+        return [np.nan] * len(month)
 
-    fig_share = go.Figure(data=go.Pie(labels=label_months,
-                                      values=monthly_share,
-                                      hoverinfo='label+percent',
-                                      marker=dict(colors=colors_list)))
-    fig_share.update_layout(title=pie_title)
-
-    fig_share.write_image(filenm)
+    return share.loc[region].reindex(list(month)).tolist()
 
 
+@profiled
+@memoized
 def monthly_unit_sold_yr(df, region):
     """Given a list of regions, loop through and return average monthly unit sold by year
     for all the specified regions on the list.
 
-    :param df: The specific dataframe imported in the main function
+    :param df: The specific dataframe imported in the main function, a RegionIndex built on it, or a
+        ColumnStore of it
     :param region: A list of specified regions/areas/communities
     :return: A dataframe reflecting the average monthly unit sold by year for all the specified regions
 
@@ -369,64 +487,19 @@ def monthly_unit_sold_yr(df, region):
     1724.0
     """
 
-    area_data = df[df['Region'] == region]
-    unit_sold_yr = area_data.groupby(area_data['Year'])['Homes Sold'].sum()
-    num_of_month = area_data.groupby(area_data['Year'])['Homes Sold'].count()
-    unit_sold_monthly_yr = unit_sold_yr / num_of_month
-
-    return unit_sold_monthly_yr
-
-
-def monthly_unit_sold_yr_plot(unit_sale_monthly_yr, chart_title, filenm):
-    """ Plot out average monthly unit sold by year for Chicago, IL
-
-    :param unit_sale_monthly_yr: series for eaverage monthly unit sold each year
-    :param chart_title: Give the plotted graph a title
-    :param filenm: Chart will be outputed to file.  Give output filename
-    :return: No explicit return. Final result is outputed to file.
-
-    """
-
-    fig_sale = go.Figure(data=go.Scatter(x=unit_sale_monthly_yr.index, y=unit_sale_monthly_yr.values,
-                                         line=dict(color='green')))
-
-    # Edit the layout
-    fig_sale.update_layout(title=chart_title, xaxis_title='Year', yaxis_title='Avg Monthly Homes Sold in Unit')
-
-    fig_sale.write_image(filenm)
-
-
-def mort_vs_mppsf_plot(df_house, df_rate, mul_graph_title, filenm):
-    """ Plot out 30-year fixed mortgage rate and Chicago area Monthly Median Sale Price per square foot in a graph
-    to see if there is a relationship between mortgage rate and house price.
-
-    :param df_house: dataframe of Chicago area including year and annually median sale Ppsf
-    :param df_rate: dataframe of 30-year fixed mortgage rate in US
-    :param mul_graph_title: Give the plotted graph a title
-    :param filenm: graph will be outputted to file.  Give output filename
-    :return: No explicit return. Final result is outputted to file.
-    """
-    fig_mort_price = make_subplots(specs=[[{'secondary_y': True}]])
-
-    fig_mort_price.add_trace(go.Bar(x=df_rate['DATE'],
-                                    y=df_rate['MORTGAGE30US'],
-                                    name='30-year fixed mortgage rate (2010 - 2019)'),
-                             secondary_y=False,)
-
-    fig_mort_price.add_trace(go.Scatter(x=df_house.index,
-                                        y=df_house.values,
-                                        name='Median Sale Ppsf in Chicago (2012 -2019)',
-                                        line=dict(color='orange')),
-                             secondary_y=True,)
+    if isinstance(df, ColumnStore):
+        return df.year_mean(region, 'Homes Sold')  # np.add.reduceat over the memory mapped slice
 
-    fig_mort_price.update_layout(title_text=mul_graph_title)
+    units = region_year_matrix(df, 'units')
 
-    fig_mort_price.update_xaxes(title_text='Year')
+    return year_row(units, region, name='Homes Sold')
 
-    fig_mort_price.update_yaxes(title_text='<b>mortgage 30-year fixed rate (%)', secondary_y=False)
-    fig_mort_price.update_yaxes(title_text='<b>median sale price per square feet ($)', secondary_y=True)
 
-    fig_mort_price.write_image(filenm)
+def __getattr__(name):
+    if name in PLOT_FUNCTIONS:
+        import housing_plots
+        return getattr(housing_plots, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 
 if __name__ == '__main__':
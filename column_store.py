@@ -0,0 +1,204 @@
+# column_store.py
+# Memory mapped NumPy store of the numeric Redfin columns, sorted by (Region, Period Begin),
+# so a region's time series is a zero-copy slice of a file shared through the page cache.
+
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from housing_cache import CACHE_DIR, cache_path, load_cleaned
+
+
+# stored columns and their on-disk dtypes (Homes Sold and Inventory are nullable, so they are
+# kept as floats with NaN)
+STORE_COLUMNS = {
+    'Median Sale Ppsf': 'float64',
+    'Homes Sold': 'float32',
+    'Inventory': 'float64',
+    'Median Dom': 'float64',
+    'Avg Sale To List': 'float32',
+    'Period Begin': 'datetime64[ns]',
+    'Year': 'int16',
+}
+
+
+def _column_file(path, column):
+    return os.path.join(path, column.lower().replace(' ', '_') + '.npy')
+
+
+class ColumnStore:
+    """Directory of .npy files, one per column in STORE_COLUMNS, with every row sorted by
+    (Region code, Period Begin) and an offsets table marking where each region starts. The
+    files are opened with mmap_mode='r': nothing is read until a slice is touched, and every
+    process opening the same store shares one copy of the pages.
+
+    Pass a store to area_ppsf_by_yr or monthly_unit_sold_yr in place of the dataframe and they
+    are answered with np.median / np.add.reduceat over the region's slice.
+
+    :param path: directory written by ColumnStore.build
+
+    >>> import tempfile, chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential_test.csv')
+    >>> store = ColumnStore.build(df_all, os.path.join(tempfile.mkdtemp(), 'test.cols'))
+    >>> len(store), store.series('Chicago, IL - Albany Park', 'Homes Sold').tolist()
+    (4, [100.0, 107.0])
+    >>> isinstance(store.columns['Median Sale Ppsf'].base, np.memmap)
+    True
+    >>> np.shares_memory(store.series('Chicago, IL', 'Median Sale Ppsf'), store.columns['Median Sale Ppsf'])
+    True
+    >>> store.year_mean('Chicago, IL', 'Homes Sold').to_dict()
+    {2014: 1724.0}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'regions.json')) as f:
+            self.names = json.load(f)
+        self._lookup = {name: i for i, name in enumerate(self.names)}
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        # plain ndarray views of the memmaps: the same pages without np.memmap's per slice overhead
+        self.columns = {col: np.load(_column_file(path, col), mmap_mode='r').view(np.ndarray)
+                        for col in STORE_COLUMNS}
+
+        # the directory name carries the CSV digest and cleaning version; the path and build time
+        # tell apart stores written elsewhere or rebuilt in place
+        self.fingerprint = 'store-{}-{}'.format(os.path.abspath(path),
+                                                os.stat(os.path.join(path, 'regions.json')).st_mtime_ns)
+
+    @classmethod
+    def build(cls, df, path):
+        """Write the store for a cleaned dataframe to the directory path and open it.
+
+        :param df: cleaned dataframe
+        :param path: directory to create (replaced if it exists)
+        :return: ColumnStore
+        """
+
+        region = df['Region'].astype('category')
+        codes = region.cat.codes.to_numpy()
+        begin = df['Period Begin'].to_numpy(dtype='datetime64[ns]')
+        order = np.lexsort((begin, codes))
+
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for col, dtype in STORE_COLUMNS.items():
+            values = df[col].to_numpy(dtype=dtype, na_value=np.nan) if dtype.startswith('float') else \
+                df[col].to_numpy(dtype=dtype)
+            np.save(_column_file(tmp_path, col), np.ascontiguousarray(values[order]))
+        names = [str(name) for name in region.cat.categories]
+        np.save(os.path.join(tmp_path, 'offsets.npy'), np.searchsorted(codes[order], np.arange(len(names) + 1)))
+        with open(os.path.join(tmp_path, 'regions.json'), 'w') as f:
+            json.dump(names, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)  # never leave a half written store behind
+
+        return cls(path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, region):
+        return region in self._lookup
+
+    def span(self, region):
+        """Return the slice of a region's rows (empty if the region is not in the store)."""
+
+        i = self._lookup.get(region)
+        if i is None:
+            return slice(0, 0)
+
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def series(self, region, column):
+        """Return a region's values of one column in Period Begin order, as a view of the file."""
+
+        return self.columns[column][self.span(region)]
+
+    def _years(self, region):
+        """Return the region's slice, its distinct years and where each year starts in the slice."""
+
+        span = self.span(region)
+        years = self.columns['Year'][span]
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]]) if len(years) else np.arange(0)
+
+        return span, np.asarray(years[starts], dtype='int64'), starts
+
+    def year_median(self, region, column='Median Sale Ppsf'):
+        """Median of a column per year for one region, keeping the years with data.
+
+        :return: series indexed by Year
+        """
+
+        span, years, starts = self._years(region)
+        values = self.columns[column][span]
+        if not len(values):
+            return _year_series(years, np.arange(0, dtype='float64'), column)
+
+        # sort each year's values in place of a per-year np.median; NaN sorts last in its year
+        counts = np.diff(np.r_[starts, len(values)])
+        ordered = values[np.lexsort((values, np.repeat(np.arange(len(starts)), counts)))]
+        valid = np.add.reduceat(~np.isnan(ordered), starts)
+        lo = starts + np.maximum(valid - 1, 0) // 2
+        hi = starts + valid // 2
+        medians = np.where(valid > 0, (ordered[lo] + ordered[np.minimum(hi, len(values) - 1)]) / 2, np.nan)
+
+        return _year_series(years, medians, column)
+
+    def year_mean(self, region, column='Homes Sold'):
+        """Mean of a column per year for one region, from one np.add.reduceat over its slice.
+        Missing values are left out of both the sums and the counts.
+
+        :return: series indexed by Year
+        """
+
+        span, years, starts = self._years(region)
+        values = self.columns[column][span]
+        if not len(values):
+            return _year_series(years, np.arange(0, dtype='float64'), column)
+        values = values.astype('float64')
+        valid = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        counts = np.add.reduceat(valid, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return _year_series(years, sums / counts, column)
+
+
+def _year_series(years, values, name):
+    keep = ~np.isnan(values)
+
+    return pd.Series(values[keep], index=pd.Index(years[keep], name='Year'), name=name)
+
+
+def store_path(csv_path, version, cache_dir=CACHE_DIR):
+    """Return the column store directory for a CSV and cleaning version, next to the cached
+    Arrow file.
+
+    >>> store_path('chicago_housing_all_residential_test.csv', '1', 'cache').endswith('-v1.cols')
+    True
+    """
+
+    return os.path.splitext(cache_path(csv_path, version, cache_dir))[0] + '.cols'
+
+
+def open_store(csv_path, loader, version, cache_dir=CACHE_DIR):
+    """Return the column store of a CSV, building it from the cleaned dataframe (see
+    housing_cache.load_cleaned) the first time.
+
+    :param csv_path: path of the source CSV
+    :param loader: function taking the CSV path and returning the cleaned dataframe
+    :param version: version string of the cleaning logic
+    :param cache_dir: directory holding the cache files
+    :return: ColumnStore
+    """
+
+    path = store_path(csv_path, version, cache_dir)
+    if os.path.isdir(path):
+        return ColumnStore(path)
+
+    return ColumnStore.build(load_cleaned(csv_path, loader, version, cache_dir), path)
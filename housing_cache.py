@@ -0,0 +1,139 @@
+# housing_cache.py
+# On-disk cache of the cleaned Redfin dataframe.
+
+
+import hashlib
+import os
+import re
+import shutil
+
+
+CACHE_DIR = '.housing_cache'
+CATEGORY_COLUMNS = ['Region', 'Property Type']
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file, read in fixed size chunks so large
+    Redfin exports never have to fit in memory.
+
+    :param path: path of the file to hash
+    :param chunk_size: number of bytes read at a time
+    :return: hex digest string
+
+    >>> len(file_digest('chicago_housing_all_residential_test.csv'))
+    64
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def cache_path(csv_path, version, cache_dir=CACHE_DIR):
+    """Return the cache file for a CSV. The name carries both the content hash of the CSV
+    and the cleaning version, so a change to either one points at a new file.
+
+    :param csv_path: path of the source CSV
+    :param version: version string of the cleaning logic
+    :param cache_dir: directory holding the cache files
+    :return: path of the Arrow file for this CSV and cleaning version
+
+    >>> cache_path('chicago_housing_all_residential_test.csv', '1', 'cache').startswith(
+    ...     os.path.join('cache', 'chicago_housing_all_residential_test-'))
+    True
+    """
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    key = file_digest(csv_path)[:16]
+
+    return os.path.join(cache_dir, '{}-{}-v{}.arrow'.format(stem, key, version))
+
+
+def load_cleaned(csv_path, loader, version, cache_dir=CACHE_DIR):
+    """Return the cleaned dataframe for a CSV, reading it from the columnar cache when the CSV
+    and the cleaning version are unchanged. On a miss the CSV is parsed and cleaned with
+    loader and written to the cache as an uncompressed Arrow file, which is memory mapped on
+    the next run so no CSV parsing happens at all.
+
+    :param csv_path: path of the source CSV
+    :param loader: function taking the CSV path and returning the cleaned dataframe
+    :param version: version string of the cleaning logic, bump it whenever the cleaning changes
+    :param cache_dir: directory holding the cache files
+    :return: the cleaned dataframe with categorical Region and Property Type
+
+    >>> import tempfile
+    >>> import pandas as pd
+    >>> tmp = tempfile.mkdtemp()
+    >>> calls = []
+    >>> def loader(path):
+    ...     calls.append(path)
+    ...     return pd.read_csv(path, sep=',')
+    >>> df = load_cleaned('chicago_housing_all_residential_test.csv', loader, '1', tmp)
+    >>> df = load_cleaned('chicago_housing_all_residential_test.csv', loader, '1', tmp)
+    >>> len(calls)
+    1
+    >>> str(df['Region'].dtype)
+    'category'
+    >>> df = load_cleaned('chicago_housing_all_residential_test.csv', loader, '2', tmp)
+    >>> len(calls), len(os.listdir(tmp))
+    (2, 1)
+    """
+
+    import pyarrow.feather as feather
+
+    path = cache_path(csv_path, version, cache_dir)
+    if os.path.exists(path):
+        table = feather.read_table(path, memory_map=True)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    df = loader(csv_path)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    clear_cache(csv_path, cache_dir)
+    tmp_path = path + '.tmp'
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)  # never leave a half written cache file behind
+
+    return df
+
+
+def clear_cache(csv_path, cache_dir=CACHE_DIR):
+    """Remove every cached version of a CSV. Only names of the exact cache_path form
+    {stem}-{16 hex digits}-v{version} are matched, so the caches of another CSV whose name
+    starts with the same stem are kept.
+
+    :param csv_path: path of the source CSV
+    :param cache_dir: directory holding the cache files
+    :return: number of files removed
+
+    >>> import tempfile
+    >>> tmp = tempfile.mkdtemp()
+    >>> for name in ['data-0123456789abcdef-v1.arrow', 'data-2019-0123456789abcdef-v1.arrow']:
+    ...     open(os.path.join(tmp, name), 'w').close()
+    >>> clear_cache('data.csv', tmp), os.listdir(tmp)
+    (1, ['data-2019-0123456789abcdef-v1.arrow'])
+    """
+
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    pattern = re.compile(re.escape(stem) + r'-[0-9a-f]{16}-v.+\.(arrow|cols)')
+    removed = 0
+    for name in os.listdir(cache_dir):
+        match = pattern.fullmatch(name)
+        if match is None:
+            continue
+        if match.group(1) == 'arrow':
+            os.remove(os.path.join(cache_dir, name))
+        else:
+            shutil.rmtree(os.path.join(cache_dir, name))  # column store built from the cleaned frame
+        removed += 1
+
+    return removed
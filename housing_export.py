@@ -0,0 +1,69 @@
+# housing_export.py
+# Writes the analysis results as data files instead of charts.
+
+
+import os
+
+import pandas as pd
+
+
+FORMATS = ('csv', 'json', 'parquet')
+
+
+def result_frame(result):
+    """Turn an analysis result into a dataframe: a dictionary of per-region series becomes one
+    column per region, a series or list a single column.
+
+    :param result: output of one of the analysis functions
+    :return: dataframe
+
+    >>> result_frame({'a': pd.Series([1.0], index=[2012]), 'b': pd.Series([2.0], index=[2013])}).shape
+    (2, 2)
+    >>> result_frame([0.5, 0.5]).index.tolist()
+    [1, 2]
+    """
+
+    if isinstance(result, pd.DataFrame):
+        return result
+    if isinstance(result, pd.Series):
+        return result.to_frame()
+    if isinstance(result, dict):
+        return pd.DataFrame(result)
+    if isinstance(result, list):
+        return pd.DataFrame({'value': result}, index=pd.RangeIndex(1, len(result) + 1, name='Month'))
+
+    raise ValueError('Cannot export a result of type {}.'.format(type(result).__name__))
+
+
+def export_results(results, out_dir, fmt='csv'):
+    """Write every result to out_dir as <name>.<fmt>.
+
+    :param results: dictionary of result name to analysis output, as from compute_aggregates
+    :param out_dir: directory to write to (created if missing)
+    :param fmt: one of FORMATS
+    :return: list of the files written
+    :raises: error if the format is unknown
+
+    >>> export_results({}, '.', 'xlsx')
+    Traceback (most recent call last):
+    ValueError: Format must be one of csv, json, parquet.
+    """
+
+    if fmt not in FORMATS:
+        raise ValueError('Format must be one of {}.'.format(', '.join(FORMATS)))
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, result in results.items():
+        df = result_frame(result)
+        df.columns = [str(c) for c in df.columns]
+        path = os.path.join(out_dir, '{}.{}'.format(name, fmt))
+        if fmt == 'csv':
+            df.to_csv(path)
+        elif fmt == 'json':
+            df.to_json(path, orient='split', date_format='iso')
+        else:
+            df.to_parquet(path)
+        written.append(path)
+
+    return written
@@ -0,0 +1,421 @@
+# housing_incremental.py
+# Incremental ingestion of new Redfin periods into persisted per (Region, Year) aggregates.
+
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from housing_cache import CATEGORY_COLUMNS
+
+
+STATE_DIR = '.housing_state'
+STATE_FORMAT = 2  # bump whenever the layout of the saved state changes
+FINGERPRINT_BLOCK = 1 << 16
+
+
+class AggregateState:
+    """Per (Region, Year) aggregates kept between runs so a new Redfin release only costs time
+    proportional to its new rows.
+
+    Every bucket holds the Homes Sold sum and count behind the average monthly units and the
+    median Median Sale Ppsf. The Ppsf values themselves are kept per year, so a batch of new
+    rows recomputes the medians of the years it touches only, with one grouped median each.
+    An exact median needs every value, so each one is kept as 12 bytes: the int32 code of its
+    region in regions and the float64 value, which float32 would round away from the medians
+    region_matrix.region_year_metrics computes.
+    ingest only takes the rows whose Period Begin is after the watermark of their region, the
+    latest Period Begin added for it so far, for callers that feed whole releases again; a
+    region whose release lags the others still gets its periods in when they arrive. add
+    takes every row it is given.
+
+    :param cleaning_version: version of the cleaning logic the rows were cleaned with
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential_test.csv')
+    >>> state = AggregateState()
+    >>> sorted(state.ingest(df_all[df_all['Year'] < 2016]))[0]
+    ('Chicago, IL', 2014)
+    >>> sorted(state.ingest(df_all))
+    [('Chicago, IL - Albany Park', 2017), ('Chicago, IL - Albany Park', 2019), ('Chicago, IL - Southwest Side', 2016)]
+    >>> state.ingest(df_all)
+    set()
+    >>> import region_matrix
+    >>> full = region_matrix.region_year_metrics(df_all)
+    >>> all(state.metrics()[m].equals(full[m]) for m in region_matrix.METRICS)
+    True
+
+    A region reporting late is still ingested after the others moved past its periods:
+
+    >>> late = df_all['Region'] == 'Chicago, IL'
+    >>> state = AggregateState()
+    >>> sorted(state.ingest(df_all[~late]))[0]
+    ('Chicago, IL - Albany Park', 2017)
+    >>> sorted(state.ingest(df_all))
+    [('Chicago, IL', 2014)]
+    """
+
+    def __init__(self, cleaning_version=None):
+        self.cleaning_version = cleaning_version
+        self.offset = 0  # bytes of the source CSV ingested so far (see refresh)
+        self.fingerprint = None
+        self.watermarks = pd.Series([], index=pd.Index([], name='Region'), dtype='datetime64[ns]')
+        self.totals = pd.DataFrame({'sold': pd.Series([], dtype='float64'), 'count': pd.Series([], dtype='float64'),
+                                    'median': pd.Series([], dtype='float64')},
+                                   index=pd.MultiIndex.from_arrays([[], []], names=['Region', 'Year']))
+        self.regions = pd.Index([], dtype=object, name='Region')  # region of each code, in order of arrival
+        self.path = None  # directory the Ppsf values of untouched years are read from on demand
+        self._values = {}  # year -> (code, value) dataframe of every Ppsf ingested for it
+        self._pending = {}  # year -> list of (code, value) dataframes not in its medians yet
+        self._dirty = set()  # years whose values have not been saved yet
+
+    @classmethod
+    def load(cls, path, cleaning_version=None):
+        """Load a state saved with save(), or return an empty state if there is none or it was
+        built with another cleaning version.
+
+        :param path: directory holding the state
+        :param cleaning_version: version of the cleaning logic the state must have been built with
+        """
+
+        try:
+            with open(os.path.join(path, 'state.json')) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return cls(cleaning_version)
+        if saved.get('format') != STATE_FORMAT or saved['cleaning_version'] != cleaning_version:
+            return cls(cleaning_version)
+
+        import pyarrow.feather as feather
+
+        state = cls(cleaning_version)
+        state.path = path
+        state.offset = saved['offset']
+        state.fingerprint = saved['fingerprint']
+        state.totals = feather.read_feather(os.path.join(path, 'totals.feather')).set_index(['Region', 'Year'])
+        watermarks = feather.read_feather(os.path.join(path, 'watermarks.feather'))
+        state.watermarks = watermarks.set_index('Region')['watermark']
+        state.regions = pd.Index(feather.read_feather(os.path.join(path, 'regions.feather'))['Region'], name='Region')
+
+        return state
+
+    def save(self, path):
+        """Write the state to a directory: the bucket totals, the region watermarks and the
+        region codes in one Feather file each, and the Ppsf values of every year ingested into
+        since the last save in a Feather file per year. The values of the other years are left
+        untouched.
+
+        :param path: directory holding the state
+        """
+
+        import pyarrow.feather as feather
+
+        self._update_medians()
+        os.makedirs(path, exist_ok=True)
+        files = {'totals.feather': self.totals.reset_index(),
+                 'watermarks.feather': self.watermarks.rename('watermark').reset_index(),
+                 'regions.feather': pd.DataFrame({'Region': self.regions.to_numpy(object)})}
+        files.update({'values-{}.feather'.format(year): self._values[year] for year in self._dirty})
+        for name, frame in files.items():
+            tmp_path = os.path.join(path, name + '.tmp')
+            feather.write_feather(frame.reset_index(drop=True), tmp_path, compression='uncompressed')
+            os.replace(tmp_path, os.path.join(path, name))
+        saved = {'format': STATE_FORMAT, 'cleaning_version': self.cleaning_version, 'offset': self.offset,
+                 'fingerprint': self.fingerprint}
+        with open(os.path.join(path, 'state.json'), 'w') as f:
+            json.dump(saved, f)
+        self.path = path
+        self._dirty = set()
+
+    def ingest(self, df):
+        """Add the rows of a cleaned dataframe newer than their region's watermark.
+
+        :param df: cleaned dataframe, typically the latest Redfin release
+        :return: set of the (region, year) buckets that received rows
+        """
+
+        regions = df['Region'].astype(str)
+        if len(self.watermarks):
+            seen = regions.map(self.watermarks)
+            df = df[seen.isna().to_numpy() | (df['Period Begin'] > seen).to_numpy()]
+        if len(df) == 0:
+            return set()
+
+        return self.add(df)
+
+    def add(self, df):
+        """Add every row of a cleaned dataframe, whatever its period, with one grouped pass,
+        and move the region watermarks up to the latest periods added.
+
+        :param df: cleaned dataframe
+        :return: set of the (region, year) buckets that received rows
+        """
+
+        regions = df['Region'].astype(str).rename('Region')
+        years = df['Year'].astype('int64').rename('Year')
+        sold = df['Homes Sold'].astype('float64')
+        new = sold.groupby([regions, years]).agg(['sum', 'count']).rename(columns={'sum': 'sold'})
+        new['count'] = new['count'].astype('float64')
+
+        totals = self.totals.reindex(self.totals.index.union(new.index))
+        totals[['sold', 'count']] = totals[['sold', 'count']].fillna(0).add(new, fill_value=0)
+        self.totals = totals
+
+        self.regions = self.regions.append(pd.Index(regions.unique()).difference(self.regions))
+        values = pd.DataFrame({'code': self.regions.get_indexer(regions).astype('int32'),
+                               'value': df['Median Sale Ppsf'].to_numpy('float64'),
+                               'Year': years.to_numpy()}).dropna(subset=['value'])
+        for year, part in values.groupby('Year'):
+            self._pending.setdefault(int(year), []).append(part[['code', 'value']].reset_index(drop=True))
+        for year in new.index.get_level_values('Year').unique():
+            self._pending.setdefault(int(year), [])
+
+        latest = df['Period Begin'].groupby(regions).max()
+        self.watermarks = pd.concat([self.watermarks, latest]).groupby(level=0).max().rename_axis('Region')
+
+        return set(new.index)
+
+    def _year_values(self, year):
+        if year not in self._values:
+            self._values[year] = pd.DataFrame({'code': pd.Series([], dtype='int32'),
+                                               'value': pd.Series([], dtype='float64')})
+            saved = None if self.path is None else os.path.join(self.path, 'values-{}.feather'.format(year))
+            if saved is not None and os.path.exists(saved):
+                import pyarrow.feather as feather
+                self._values[year] = feather.read_feather(saved)
+
+        return self._values[year]
+
+    def _update_medians(self):
+        """Recompute the medians of the years rows were added to since the last call."""
+
+        for year, parts in self._pending.items():
+            values = pd.concat([self._year_values(year)] + parts, ignore_index=True)
+            self._values[year] = values
+            medians = values.groupby('code')['value'].median()
+            medians.index = self.regions[medians.index]
+            in_year = self.totals.index.get_level_values('Year') == year
+            regions = self.totals.index[in_year].get_level_values('Region')
+            self.totals.loc[in_year, 'median'] = medians.reindex(regions).to_numpy()
+            self._dirty.add(year)
+        self._pending = {}
+
+    def metrics(self):
+        """Return the aggregates as the Region x Year matrices of region_matrix.region_year_metrics.
+
+        :return: dictionary of metric name to Region x Year dataframe
+        """
+
+        self._update_medians()
+        totals = self.totals.sort_index()
+        years = totals.index.get_level_values('Year')
+        years = range(int(years.min()), int(years.max()) + 1) if len(totals) else []
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            units = totals['sold'] / totals['count'].where(totals['count'] > 0)
+        ppsf = totals['median'].unstack('Year').reindex(columns=years)
+        units = units.unstack('Year').reindex(columns=years)
+        pct = (ppsf / ppsf.shift(1, axis=1) - 1) * 100
+
+        for matrix in (ppsf, pct, units):
+            matrix.index.name = 'Region'
+            matrix.columns.name = 'Year'
+
+        return {'ppsf': ppsf, 'ppsf_pct': pct, 'units': units}
+
+
+def state_path(csv_path):
+    """Return the state directory of a Redfin CSV, so each input keeps its own aggregates.
+
+    >>> state_path('data/chicago_housing_all_residential.csv')
+    '.housing_state.chicago_housing_all_residential'
+    """
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+
+    return '{}.{}'.format(STATE_DIR, stem)
+
+
+def source_fingerprint(csv_path, offset, block=FINGERPRINT_BLOCK):
+    """Digest of the first block of a CSV and of the block ending at offset. A release that
+    only appends rows to the one ingested keeps both, while another file or a rewritten
+    history changes them; reading two blocks keeps the check O(1) in the size of the file.
+
+    :param csv_path: path of the CSV
+    :param offset: number of bytes ingested so far
+    :param block: bytes hashed at each end
+    :return: hex digest string, or None if the file is shorter than offset
+
+    >>> source_fingerprint('chicago_housing_all_residential_test.csv', 10 ** 9) is None
+    True
+    """
+
+    if os.path.getsize(csv_path) < offset:
+        return None
+
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        digest.update(f.read(min(block, offset)))
+        f.seek(max(offset - block, 0))
+        digest.update(f.read(min(block, offset)))
+
+    return digest.hexdigest()
+
+
+def read_new_rows(csv_path, offset, parse):
+    """Parse the rows of a CSV past a byte offset, under the CSV's header. A last line without
+    its newline is left for the next run, as the file may still be being written.
+
+    :param csv_path: path of the CSV
+    :param offset: number of bytes already ingested (0 for none)
+    :param parse: function taking a CSV file object and returning the cleaned dataframe
+    :return: (cleaned dataframe of the new rows, or None if there are none, new offset)
+    """
+
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        offset = max(offset, len(header))
+        f.seek(offset)
+        new = f.read()
+
+    new = new[:new.rfind(b'\n') + 1]
+    if not new.strip():
+        return None, offset + len(new)
+
+    return parse(io.BytesIO(header + new)), offset + len(new)
+
+
+def append_rows(path, df):
+    """Append cleaned rows to the per year Feather files of a state directory, so the analyses
+    that need rows rather than the yearly matrices can read them back without the CSV. Only
+    the files of the years in df are rewritten.
+
+    :param path: directory holding the state
+    :param df: cleaned dataframe of the new rows
+    """
+
+    import pyarrow.feather as feather
+
+    os.makedirs(path, exist_ok=True)
+    for year, part in df.groupby('Year'):
+        name = os.path.join(path, 'rows-{}.feather'.format(int(year)))
+        if os.path.exists(name):
+            part = pd.concat([feather.read_feather(name), part], ignore_index=True)
+        for col in CATEGORY_COLUMNS:
+            if col in part.columns:
+                part[col] = part[col].astype(str)
+        feather.write_feather(part.reset_index(drop=True), name + '.tmp', compression='uncompressed')
+        os.replace(name + '.tmp', name)
+
+
+def stored_rows(path):
+    """Return every row appended with append_rows as one cleaned dataframe, years in order and
+    Region and Property Type as categories, like housing_cache.load_cleaned.
+
+    :param path: directory holding the state
+    :return: cleaned dataframe, or None if no rows were stored
+    """
+
+    import pyarrow.feather as feather
+
+    names = [name for name in os.listdir(path) if name.startswith('rows-')] if os.path.isdir(path) else []
+    if not names:
+        return None
+
+    names.sort(key=lambda name: int(name[len('rows-'):-len('.feather')]))
+    df = pd.concat([feather.read_feather(os.path.join(path, name)) for name in names], ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+def refresh(csv_path, parse, cleaning_version, path=None):
+    """Ingest the rows appended to a Redfin CSV since the last run into the persisted state and
+    return the updated Region x Year matrices. Only the bytes past the stored offset are read
+    and parsed, so a run costs time proportional to the new rows. The cleaned new rows are
+    also appended to the state's per year row files, which stored_rows reads back for the
+    per region analyses without hashing or parsing the CSV again. The offset alone keeps a
+    row from being counted twice, so every new row is added whatever its period: a region
+    listed twice for a period keeps both rows when an append falls between them.
+
+    Releases are expected to append rows to the CSV ingested before. The state is rebuilt from
+    the whole file when the cleaning version changes or when the start of the file or the
+    block before the offset differs from the one ingested, e.g. another CSV or a release
+    revising earlier rows.
+
+    :param csv_path: path of the Redfin CSV
+    :param parse: function taking a CSV file object and returning the cleaned dataframe
+    :param cleaning_version: version string of the cleaning logic
+    :param path: directory holding the state between runs (default state_path(csv_path))
+    :return: dictionary of metric name to Region x Year dataframe
+
+    >>> import tempfile, chicago_housing_analysis, region_matrix
+    >>> tmp = tempfile.mkdtemp()
+    >>> csv, path = os.path.join(tmp, 'redfin.csv'), os.path.join(tmp, 'state')
+    >>> with open('chicago_housing_all_residential.csv', 'rb') as f:
+    ...     lines = f.readlines()
+    >>> with open(csv, 'wb') as f:
+    ...     f.writelines(lines[:2000])
+    >>> metrics = refresh(csv, chicago_housing_analysis.read_cleaned_csv, '2', path)
+    >>> with open(csv, 'ab') as f:
+    ...     f.writelines(lines[2000:])
+    >>> metrics = refresh(csv, chicago_housing_analysis.read_cleaned_csv, '2', path)
+    >>> AggregateState.load(path, '2').offset == os.path.getsize(csv)
+    True
+    >>> full = region_matrix.region_year_metrics(chicago_housing_analysis.read_cleaned_csv(csv))
+    >>> all(metrics[m].equals(full[m]) for m in region_matrix.METRICS)
+    True
+    >>> rows = stored_rows(path)
+    >>> len(rows) == len(lines) - 1, str(rows['Region'].dtype)
+    (True, 'category')
+
+    Chicago, IL - Rosehill is listed twice for January 2012, on lines 59 and 214; an append
+    between the two keeps both:
+
+    >>> with open(csv, 'wb') as f:
+    ...     f.writelines(lines[:100])
+    >>> metrics = refresh(csv, chicago_housing_analysis.read_cleaned_csv, '2', path)
+    >>> with open(csv, 'ab') as f:
+    ...     f.writelines(lines[100:])
+    >>> metrics = refresh(csv, chicago_housing_analysis.read_cleaned_csv, '2', path)
+    >>> all(metrics[m].equals(full[m]) for m in region_matrix.METRICS)
+    True
+
+    Another file under the same name, or another cleaning version, rebuilds the state:
+
+    >>> with open(csv, 'wb') as f:
+    ...     f.writelines(lines[:1] + lines[3000:])
+    >>> metrics = refresh(csv, chicago_housing_analysis.read_cleaned_csv, '2', path)
+    >>> full = region_matrix.region_year_metrics(chicago_housing_analysis.read_cleaned_csv(csv))
+    >>> all(metrics[m].equals(full[m]) for m in region_matrix.METRICS)
+    True
+    >>> AggregateState.load(path, '3').offset
+    0
+    """
+
+    if path is None:
+        path = state_path(csv_path)
+
+    state = AggregateState.load(path, cleaning_version)
+    if state.offset and source_fingerprint(csv_path, state.offset) != state.fingerprint:
+        state = AggregateState(cleaning_version)
+    if state.offset == 0 and os.path.isdir(path):
+        shutil.rmtree(path)  # values of a stale state must not be read back
+
+    df, offset = read_new_rows(csv_path, state.offset, parse)
+    if df is not None:
+        state.add(df)
+        append_rows(path, df)
+    if offset != state.offset:
+        state.offset = offset
+        state.fingerprint = source_fingerprint(csv_path, offset)
+        state.save(path)
+
+    return state.metrics()
@@ -0,0 +1,199 @@
+# housing_memo.py
+# Memoization of the aggregation functions, keyed on a fingerprint of the dataset.
+
+
+import collections
+import functools
+import hashlib
+import inspect
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+MAX_BYTES = 256 * 2 ** 20
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses entries bytes max_bytes hit_rate')
+
+
+class AggregateCache:
+    """LRU cache of aggregation results bounded by the memory the results hold.
+
+    :param max_bytes: results are evicted, least recently used first, beyond this many bytes
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # the query server calls in from many threads
+
+    def get(self, key):
+        """Return (True, result) for a cached key, (False, None) otherwise."""
+
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        size = _nbytes(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes = self.hits = self.misses = 0
+
+    def info(self):
+        calls = self.hits + self.misses
+        return CacheInfo(self.hits, self.misses, len(self.entries), self.bytes, self.max_bytes,
+                         self.hits / calls if calls else 0.0)
+
+
+CACHE = AggregateCache()
+
+_fingerprint_lock = threading.Lock()
+
+# id(df) -> (weak reference to df, fingerprint); the weak reference tells a live frame from a
+# new one that happens to reuse the id of a collected frame
+_fingerprints = {}
+
+
+def _nbytes(result):
+    """Approximate memory held by a result."""
+
+    if isinstance(result, (pd.Series, pd.DataFrame)):
+        return int(pd.Series(result.memory_usage(deep=True)).sum())
+    if isinstance(result, dict):
+        return sum(_nbytes(v) for v in result.values())
+    if isinstance(result, (list, tuple)):
+        return sum(_nbytes(v) for v in result) + 8 * len(result)
+
+    return 64
+
+
+def dataset_fingerprint(data):
+    """Return a fingerprint of the contents of a dataframe, or of the dataframe under a
+    RegionIndex; a ColumnStore carries its own. It is computed with one hashing pass the
+    first time a frame is seen and remembered for as long as the frame lives, so frames must
+    not be modified in place once they are being analysed.
+
+    :param data: dataframe, RegionIndex or ColumnStore
+    :return: string identifying the data
+
+    >>> df = pd.DataFrame({'Region': ['a', 'b'], 'Homes Sold': [1, 2]})
+    >>> dataset_fingerprint(df) == dataset_fingerprint(df.copy())
+    True
+    >>> dataset_fingerprint(df) == dataset_fingerprint(df.iloc[:1])
+    False
+    >>> dataset_fingerprint(df) == dataset_fingerprint(df.iloc[::-1])
+    False
+    >>> dataset_fingerprint(df) == dataset_fingerprint(df.astype({'Homes Sold': 'float64'}))
+    False
+    """
+
+    if isinstance(getattr(data, 'fingerprint', None), str):
+        return data.fingerprint  # a ColumnStore is named after its CSV digest and cleaning version
+
+    df = getattr(data, 'df', data)
+    with _fingerprint_lock:
+        entry = _fingerprints.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+        # the row hashes are digested in order, so a reordered frame gets its own fingerprint
+        digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode('utf-8'))
+        fingerprint = '{}-{}'.format(digest.hexdigest()[:32], len(df))
+        key = id(df)
+        _fingerprints[key] = (weakref.ref(df, lambda _: _fingerprints.pop(key, None)), fingerprint)
+
+    return fingerprint
+
+
+def _freeze(value):
+    """Turn list and range arguments into hashable cache key parts."""
+
+    if isinstance(value, (list, tuple, range)):
+        return tuple(_freeze(v) for v in value)
+
+    return value
+
+
+def _copy(result):
+    """Copy the pandas and NumPy parts of a result, inside dictionaries, lists and tuples too."""
+
+    if isinstance(result, (pd.Series, pd.DataFrame, np.ndarray)):
+        return result.copy()
+    if isinstance(result, dict):
+        return {k: _copy(v) for k, v in result.items()}
+    if isinstance(result, (list, tuple)):
+        return type(result)(_copy(v) for v in result)
+
+    return result
+
+
+def memoized(func):
+    """Decorator caching a function of (dataset, ...) in CACHE under the dataset fingerprint
+    and the remaining arguments. Every call gets its own copy of the pandas and NumPy parts
+    of the result, so callers may modify what they are given without touching the cache.
+
+    >>> calls = []
+    >>> @memoized
+    ... def totals(df, column):
+    ...     calls.append(column)
+    ...     return df.groupby('Region')[column].sum()
+    >>> df = pd.DataFrame({'Region': ['a', 'b'], 'Homes Sold': [1, 2]})
+    >>> first = totals(df, 'Homes Sold')
+    >>> first.iloc[0] = -1
+    >>> totals(df, 'Homes Sold').tolist(), len(calls)
+    ([1, 2], 1)
+    """
+
+    name = func.__module__ + '.' + func.__qualname__
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(data, *args, **kwargs):
+        # bind the arguments so f(df, x), f(df, x=x) and a defaulted x share one key
+        bound = signature.bind(data, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple((k, _freeze(v)) for k, v in list(bound.arguments.items())[1:])
+        key = (name, dataset_fingerprint(data), arguments)
+        found, result = CACHE.get(key)
+        if not found:
+            result = func(data, *args, **kwargs)
+            CACHE.put(key, result)
+        return _copy(result)
+
+    return wrapper
+
+
+def cache_info():
+    """Return the hits, misses, size and hit rate of the aggregation cache."""
+
+    return CACHE.info()
+
+
+def clear():
+    """Empty the aggregation cache and reset its counters."""
+
+    CACHE.clear()
@@ -0,0 +1,267 @@
+# housing_plots.py
+# Plotly charts of the Chicago housing analysis. Kept apart from the aggregation code so that
+# data-only consumers never import plotly; chicago_housing_analysis loads it on first use.
+
+
+import plotly.colors
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+
+from chart_render import write_figure
+from housing_profile import profiled
+
+
+def default_colors(n):
+    """Return n colors from plotly's qualitative palette, repeating it as needed, for charts
+    whose regions are picked at run time (e.g. a top-K ranking).
+
+    >>> default_colors(2)
+    ['#636EFA', '#EF553B']
+    """
+
+    palette = plotly.colors.qualitative.Plotly
+
+    return [palette[i % len(palette)] for i in range(n)]
+
+
+@profiled
+def ppsf_by_yr_plot(df_dict, colors, chart_title, filenm, renderer=None):
+    """ Plot out medium sale ppsf by year for each specified region in
+    the specified dataframe.
+
+    :param df_dict: dictionary of medium ppsf data by region
+    :param colors: a list of colors to be graphed for each region
+    (Should be same length as number of regions in the dataframe), or None for default_colors
+    :param chart_title: Give the plotted graph a title
+    :param filenm: Chart will be outputted to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+
+    >>> from chicago_housing_analysis import df_cleaning, mult_area_ppsf_by_yr, pd
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> df_all = df_cleaning(df_all)
+    >>> area_list = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side']
+    >>> df_by_area = mult_area_ppsf_by_yr(df_all, area_list)
+    >>> color_list = ['firebrick', 'pink', 'green', 'black']
+    >>> ppsf_by_yr_plot(df_by_area, color_list, 'title','file.png')
+    Traceback (most recent call last):
+    ValueError: Length of df_dict and colors must be equal.
+    """
+
+    dict_regions_list = list(df_dict.keys())  # region list, e.g. in the order of a ranking
+    if colors is None:
+        colors = default_colors(len(dict_regions_list))
+
+    if not len(dict_regions_list) == len(colors):
+        raise ValueError('Length of df_dict and colors must be equal.')
+
+    color_dict = {dict_regions_list[i]: colors[i] for i in range(len(dict_regions_list))}
+
+    fig = go.Figure()
+
+    for i in df_dict.keys():
+        df = df_dict.get(i)  # get values with key as "i"
+        fig.add_trace(go.Scatter(x=df.index, y=df.values,
+                                 name=i, line=dict(color=color_dict.get(i), width=1)))
+
+    # Edit the layout
+    fig.update_layout(title=chart_title, xaxis_title='Year', yaxis_title='Ppsf($)')
+
+    write_figure(fig, filenm, renderer)
+
+
+@profiled
+def perc_by_yr_plot(df_dict, colors, chart_title, filenm, renderer=None):
+    """ Plot out percentage change by year for each specified regions/community in
+    the specified dataframe.
+
+    :param df_dict: dictionary of percentage change data by region
+    :param colors: a list of colors to be graphed for each region
+    (Should be same length as number of regions in the dataframe), or None for default_colors
+    :param chart_title: Give the plotted graph a title
+    :param filenm: Chart will be outputted to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+
+    >>> from chicago_housing_analysis import df_cleaning, mult_area_perc_by_yr, pd
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> df_all = df_cleaning(df_all)
+    >>> area_list = ['Chicago, IL', 'Chicago, IL - Central Chicago', 'Chicago, IL - Far North Side']
+    >>> df_by_area = mult_area_perc_by_yr(df_all, area_list)
+    >>> color_list = ['firebrick', 'pink', 'green', 'black']
+    >>> perc_by_yr_plot(df_by_area, color_list, 'title','file.png')
+    Traceback (most recent call last):
+    ValueError: Length of df_dict and colors must be equal.
+    """
+
+    dict_regions_list = list(df_dict.keys())  # region list, e.g. in the order of a ranking
+    if colors is None:
+        colors = default_colors(len(dict_regions_list))
+
+    if not len(dict_regions_list) == len(colors):
+        raise ValueError('Length of df_dict and colors must be equal.')
+
+    color_dict = {dict_regions_list[i]: colors[i] for i in range(len(dict_regions_list))}
+
+    for i in df_dict.keys():
+
+        df = df_dict.get(i)
+        fig_perc = go.Figure(data=go.Scatter(x=df.index, y=df.values,
+                                             name=i, line=dict(color=color_dict.get(i), width=1)))
+
+        # Edit the layout
+        fig_perc.update_layout(title_text=chart_title + ' - ' + i, yaxis_title='percentage change (%)')
+
+        write_figure(fig_perc, filenm + '_' + i + '.png', renderer)
+
+
+@profiled
+def season_by_month_plot(chi_data, colors, bar_title, filenm, renderer=None):
+    """ Plot out seasonality activity by month for Chicago in
+    the specified dataframe.
+
+    :param chi_data: dataframe of seasonality activity for Chicago, IL
+    :param colors: a list of colors to be graphed for each region, or None for default_colors
+    :param bar_title: Give the plotted graph a title
+    :param filenm: Chart will be outputted to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+
+    >>> from chicago_housing_analysis import df_cleaning, season_activity, pd
+    >>> df_all = pd.read_csv('chicago_housing_all_residential.csv', sep=',')
+    >>> df_all = df_cleaning(df_all)
+    >>> chi_data = season_activity(df_all, 'Chicago, IL')
+    >>> color_list = ['firebrick', 'pink', 'green']
+    >>> season_by_month_plot(chi_data, color_list, 'title','file.png')
+    Traceback (most recent call last):
+    ValueError: Length of df_dict and colors must be equal.
+    """
+    columns_list = list(chi_data.columns)
+    if colors is None:
+        colors = default_colors(len(columns_list))
+
+    if not len(columns_list) == len(colors):
+        raise ValueError('Length of df_dict and colors must be equal.')
+
+    color_dict = {columns_list[i]: colors[i] for i in range(len(columns_list))}
+
+    for i in columns_list:
+
+        fig_season = go.Figure(data=go.Bar(x=chi_data.index, y=chi_data[i],
+                                           name=i, marker_color=color_dict.get(i)))
+
+        # Edit the layout
+        fig_season.update_layout(title=bar_title + ' - ' + i + ' from 2012 - 2019')
+
+        write_figure(fig_season, filenm + '_' + i + '.png', renderer)
+
+
+@profiled
+def monthly_sale_share_plot(monthly_share, pie_title, filenm, renderer=None):
+    """ Plot out the share of monthly unit sale for Chicago.
+    :param monthly_share: a list of the share of monthly unit sale for Chicago, IL
+    :param pie_title: Give the plotted graph a title
+    :param filenm: Chart will be outputted to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+    """
+
+    label_months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+                    'October', 'November', 'December']
+    colors_list = ['#1f77b4', '#ff7f0e', '#9467bd', '#2ca02c', '#d62728', '#e377c2',
+                   '#FDB603', '#639702', '#dacde6', '#faec72', '#9ab973', '#87cefa']
+
+    fig_share = go.Figure(data=go.Pie(labels=label_months,
+                                      values=monthly_share,
+                                      hoverinfo='label+percent',
+                                      marker=dict(colors=colors_list)))
+    fig_share.update_layout(title=pie_title)
+
+    write_figure(fig_share, filenm, renderer)
+
+
+@profiled
+def monthly_unit_sold_yr_plot(unit_sale_monthly_yr, chart_title, filenm, renderer=None):
+    """ Plot out average monthly unit sold by year for Chicago, IL
+
+    :param unit_sale_monthly_yr: series for eaverage monthly unit sold each year
+    :param chart_title: Give the plotted graph a title
+    :param filenm: Chart will be outputed to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputed to file.
+
+    """
+
+    fig_sale = go.Figure(data=go.Scatter(x=unit_sale_monthly_yr.index, y=unit_sale_monthly_yr.values,
+                                         line=dict(color='green')))
+
+    # Edit the layout
+    fig_sale.update_layout(title=chart_title, xaxis_title='Year', yaxis_title='Avg Monthly Homes Sold in Unit')
+
+    write_figure(fig_sale, filenm, renderer)
+
+
+@profiled
+def mort_vs_mppsf_plot(df_house, df_rate, mul_graph_title, filenm, renderer=None):
+    """ Plot out 30-year fixed mortgage rate and Chicago area Monthly Median Sale Price per square foot in a graph
+    to see if there is a relationship between mortgage rate and house price.
+
+    :param df_house: dataframe of Chicago area including year and annually median sale Ppsf
+    :param df_rate: dataframe of 30-year fixed mortgage rate in US
+    :param mul_graph_title: Give the plotted graph a title
+    :param filenm: graph will be outputted to file.  Give output filename
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+    """
+    fig_mort_price = make_subplots(specs=[[{'secondary_y': True}]])
+
+    fig_mort_price.add_trace(go.Bar(x=df_rate['DATE'],
+                                    y=df_rate['MORTGAGE30US'],
+                                    name='30-year fixed mortgage rate (2010 - 2019)'),
+                             secondary_y=False,)
+
+    fig_mort_price.add_trace(go.Scatter(x=df_house.index,
+                                        y=df_house.values,
+                                        name='Median Sale Ppsf in Chicago (2012 -2019)',
+                                        line=dict(color='orange')),
+                             secondary_y=True,)
+
+    fig_mort_price.update_layout(title_text=mul_graph_title)
+
+    fig_mort_price.update_xaxes(title_text='Year')
+
+    fig_mort_price.update_yaxes(title_text='<b>mortgage 30-year fixed rate (%)', secondary_y=False)
+    fig_mort_price.update_yaxes(title_text='<b>median sale price per square feet ($)', secondary_y=True)
+
+    write_figure(fig_mort_price, filenm, renderer)
+
+
+@profiled
+def ranking_plot(ranks, chart_title, filenm, colors=None, renderer=None):
+    """ Plot a ranking of regions as horizontal bars, best first at the top.
+
+    :param ranks: series of region to value in ranked order, as from region_rank.rank_regions
+    :param chart_title: Give the plotted graph a title
+    :param filenm: Chart will be outputted to file.  Give output filename
+    :param colors: a list of colors, one per region, or None for default_colors
+    :param renderer: optional RenderPool the chart is queued on instead of being written right away
+    :return: No explicit return. Final result is outputted to file.
+
+    >>> import pandas as pd
+    >>> ranking_plot(pd.Series([2.0, 1.0], index=['a', 'b']), 'title', 'file.png', colors=['red'])
+    Traceback (most recent call last):
+    ValueError: Length of ranks and colors must be equal.
+    """
+
+    if colors is None:
+        colors = default_colors(len(ranks))
+    if not len(ranks) == len(colors):
+        raise ValueError('Length of ranks and colors must be equal.')
+
+    fig_rank = go.Figure(data=go.Bar(x=ranks.values[::-1], y=list(ranks.index)[::-1], orientation='h',
+                                     marker_color=list(colors)[::-1]))
+
+    # Edit the layout
+    fig_rank.update_layout(title=chart_title, xaxis_title=ranks.name if isinstance(ranks.name, str) else None)
+
+    write_figure(fig_rank, filenm, renderer)
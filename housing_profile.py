@@ -0,0 +1,209 @@
+# housing_profile.py
+# Stage level instrumentation of the analysis run.
+
+
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+PROFILE_ENV = 'HOUSING_PROFILE'
+PROFILE_STAGE_ENV = 'HOUSING_PROFILE_STAGE'
+REPORT_PATH = 'housing_profile.json'
+
+
+class RunReport:
+    """Stage records of one run. Recording only happens while enabled; disabled, every
+    instrumented call costs a single attribute check.
+
+    :param enabled: record stages
+    :param capture: name of the one stage to run under cProfile and tracemalloc
+    """
+
+    def __init__(self, enabled=False, capture=None):
+        self.enabled = enabled
+        self.capture = capture
+        self.stages = []
+        self.started = time.time()
+        self.depth = 0  # number of stages currently open
+
+    def summary(self, top=None):
+        """Return a short text table of the stages, slowest first. Stages nested in another one
+        are listed but left out of the total, which would otherwise count their time twice."""
+
+        stages = sorted(self.stages, key=lambda s: s['seconds'], reverse=True)[:top]
+        lines = ['{:<28} {:>9} {:>9} {:>9} {:>10} {:>11}'.format(
+            'stage', 'seconds', 'rows in', 'rows out', 'rss +KB', 'bytes out')]
+        for s in stages:
+            lines.append('{:<28} {:>9.4f} {:>9} {:>9} {:>10} {:>11}'.format(
+                s['name'][:28], s['seconds'], _blank(s['rows_in']), _blank(s['rows_out']),
+                _blank(s['max_rss_delta_kb']), _blank(s['bytes_written'])))
+        top_level = [s for s in self.stages if s['depth'] == 0]
+        lines.append('total {:.3f} s over {} top-level stages ({} stages in all)'.format(
+            sum(s['seconds'] for s in top_level), len(top_level), len(self.stages)))
+
+        return '\n'.join(lines)
+
+    def write(self, path=REPORT_PATH):
+        """Write the stages to a JSON report."""
+
+        with open(path, 'w') as f:
+            json.dump({'started': self.started, 'stages': self.stages}, f, indent=1)
+
+
+def _blank(value):
+    return '' if value is None else value
+
+
+REPORT = RunReport(enabled=bool(os.environ.get(PROFILE_ENV)), capture=os.environ.get(PROFILE_STAGE_ENV) or None)
+
+
+def enable(capture=None):
+    """Turn recording on for the rest of the run, optionally capturing one stage in detail."""
+
+    REPORT.enabled = True
+    if capture is not None:
+        REPORT.capture = capture
+
+
+def _max_rss_kb():
+    return None if resource is None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _bytes_written():
+    """Bytes this process has passed to write calls so far (Linux only)."""
+
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _rows(value):
+    """Row count of a dataframe, series, RegionIndex or container (None if it has no length)."""
+
+    value = getattr(value, 'df', value)  # RegionIndex
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class StageRecord(dict):
+    """Measurements of one stage, filled in while the stage runs."""
+
+    def add_output(self, paths):
+        """Count the sizes of files the stage wrote in a way not seen by this process's write
+        calls (for example files written by worker processes)."""
+
+        for path in paths:
+            if os.path.exists(path):
+                self['bytes_written'] = (self['bytes_written'] or 0) + os.path.getsize(path)
+
+    def set_rows_out(self, value):
+        self['rows_out'] = _rows(value)
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    """Record wall time, rows, peak RSS growth and bytes written for a block of code, and how
+    many stages it runs inside of.
+
+    :param name: stage name shown in the report
+    :param rows_in: input the stage works on (its length is reported), if any
+    :return: the StageRecord being filled (None while recording is off)
+
+    >>> enable()
+    >>> with stage('doctest', rows_in=[1, 2, 3]) as record:
+    ...     record.set_rows_out([1])
+    >>> REPORT.stages[-1]['name'], REPORT.stages[-1]['rows_in'], REPORT.stages[-1]['rows_out']
+    ('doctest', 3, 1)
+    >>> with stage('outer'):
+    ...     with stage('inner'):
+    ...         pass
+    >>> [(s['name'], s['depth']) for s in REPORT.stages[-2:]]
+    [('inner', 1), ('outer', 0)]
+    >>> REPORT.enabled = False
+    """
+
+    if not REPORT.enabled:
+        yield None
+        return
+
+    record = StageRecord(name=name, depth=REPORT.depth, seconds=None, rows_in=_rows(rows_in), rows_out=None,
+                         max_rss_delta_kb=None, bytes_written=None)
+    rss = _max_rss_kb()
+    written = _bytes_written()
+    profiler = None
+    if REPORT.capture == name:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    REPORT.depth += 1
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        REPORT.depth -= 1
+        if profiler is not None:
+            profiler.disable()
+        if rss is not None:
+            record['max_rss_delta_kb'] = _max_rss_kb() - rss
+        if written is not None:
+            record['bytes_written'] = (record['bytes_written'] or 0) + _bytes_written() - written
+        if profiler is not None:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            _store_capture(record, profiler, peak, snapshot)
+        REPORT.stages.append(dict(record))
+
+
+def _store_capture(record, profiler, peak, snapshot):
+    """Attach the cProfile and tracemalloc results of a captured stage to its record."""
+
+    profiler.dump_stats('profile-{}.prof'.format(record['name']))
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(20)
+    record['cprofile'] = text.getvalue()
+    record['tracemalloc_peak_bytes'] = peak
+    record['tracemalloc_top'] = [str(stat) for stat in snapshot.statistics('lineno')[:10]]
+
+
+def profiled(func):
+    """Decorator running a function as a stage named after it, with its first argument as the
+    rows in and its return value as the rows out.
+
+    >>> @profiled
+    ... def double(values):
+    ...     return values + values
+    >>> double([1])
+    [1, 1]
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not REPORT.enabled:
+            return func(*args, **kwargs)
+        with stage(func.__name__, rows_in=args[0] if args else None) as record:
+            result = func(*args, **kwargs)
+            record.set_rows_out(result)
+        return result
+
+    return wrapper
@@ -0,0 +1,391 @@
+# housing_report.py
+# Declarative report specs: the region groups, metrics, year windows and charts of a report
+# live in a JSON or TOML file instead of in code. A planner merges the aggregations behind
+# every output of every report in a job, so each (region, metric) is computed only once.
+
+
+import json
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+import numpy as np
+import pandas as pd
+
+import chicago_housing_analysis as cha
+from housing_profile import stage
+from region_matrix import METRICS, region_year_metrics, year_row
+from region_rank import top_k
+from region_tree import DEFAULT_TREE, load_tree, region_rollup
+
+
+DEFAULT_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports', 'default.json')
+
+# analyses that are not read off the Region x Year matrices; each runs once per distinct arguments
+REGION_ANALYSES = ('season_activity', 'monthly_sale_share')
+
+# chart type -> (plot function, whether it takes a color per region)
+CHARTS = {
+    'ppsf_by_yr': ('ppsf_by_yr_plot', True),
+    'perc_by_yr': ('perc_by_yr_plot', True),
+    'season_by_month': ('season_by_month_plot', True),
+    'monthly_sale_share': ('monthly_sale_share_plot', False),
+    'monthly_unit_sold_yr': ('monthly_unit_sold_yr_plot', False),
+    'mort_vs_mppsf': ('mort_vs_mppsf_plot', False),
+    'ranking': ('ranking_plot', False),
+}
+
+# sales weighted metrics read off the region hierarchy rollup of the spec's 'hierarchy' file
+ROLLUP_METRICS = {'rollup_ppsf': 'ppsf', 'rollup_units': 'units'}
+
+SERIES_NAMES = {'ppsf': 'Median Sale Ppsf', 'ppsf_pct': 'Median Sale Ppsf', 'units': 'Homes Sold'}
+
+
+def load_spec(path=DEFAULT_SPEC):
+    """Read a report spec from a JSON or TOML (.toml) file and check it. The report is named
+    after the file unless the spec gives a name.
+
+    :param path: path of the spec
+    :return: dictionary of the spec
+    :raises: error if the spec is not valid
+
+    >>> spec = load_spec()
+    >>> spec['name'], len(spec['outputs']), len(spec['groups']['sides'])
+    ('default', 8, 10)
+    """
+
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError('TOML report specs need Python 3.11 or later.')
+        with open(path, 'rb') as f:
+            spec = tomllib.load(f)
+    else:
+        with open(path) as f:
+            spec = json.load(f)
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+
+    return check_spec(spec)
+
+
+def check_spec(spec):
+    """Check that every ranked group of a spec is well formed and that every output names a
+    known metric, its regions and, if charted, a known chart type. A group is either a list
+    of regions or a ranking picked at run time, e.g.
+    {"top": 8, "metric": "ppsf", "year": 2019, "among": "communities"} (or "bottom": k);
+    "among" is a list group or list of candidate regions, every region when left out.
+
+    :param spec: dictionary of the spec
+    :return: the spec
+    :raises: error naming the first problem found
+
+    >>> check_spec({'name': 'r', 'outputs': [{'name': 'a', 'metric': 'price', 'region': 'Chicago, IL'}]})
+    ... # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ValueError: Output a of report r: metric must be one of ppsf, ppsf_pct, units, ..., rollup_units.
+    >>> check_spec({'name': 'r', 'outputs': [{'name': 'a', 'metric': 'ppsf', 'regions': 'sides'}]})
+    Traceback (most recent call last):
+    ValueError: Output a of report r: unknown region group sides.
+    >>> check_spec({'name': 'r', 'groups': {'top': {'top': 8, 'year': 2019, 'among': 'sides'}}, 'outputs': []})
+    Traceback (most recent call last):
+    ValueError: Group top of report r: among must name a list group.
+    """
+
+    spec.setdefault('groups', {})
+    for name, group in spec['groups'].items():
+        if isinstance(group, dict):
+            def fail(problem):
+                raise ValueError('Group {} of report {}: {}.'.format(name, spec.get('name'), problem))
+
+            size = group.get('top', group.get('bottom'))
+            if ('top' in group) == ('bottom' in group) or not isinstance(size, int):
+                fail('give the number of regions as exactly one of top and bottom')
+            if not isinstance(group.get('year'), int):
+                fail('give the year to rank on')
+            if group.get('metric', 'ppsf') not in METRICS:
+                fail('metric must be one of {}'.format(', '.join(METRICS)))
+            among = group.get('among')
+            if isinstance(among, str) and not isinstance(spec['groups'].get(among), list):
+                fail('among must name a list group')
+
+    names = set()
+    for output in spec.get('outputs', []):
+        def fail(problem):
+            raise ValueError('Output {} of report {}: {}.'.format(output.get('name'), spec.get('name'), problem))
+
+        if output.get('name') in names:
+            fail('duplicate output name')
+        names.add(output.get('name'))
+        known = METRICS + REGION_ANALYSES + tuple(ROLLUP_METRICS)
+        if output.get('metric') not in known:
+            fail('metric must be one of {}'.format(', '.join(known)))
+        if ('region' in output) == ('regions' in output):
+            fail('give exactly one of region and regions')
+        if isinstance(output.get('regions'), str) and output['regions'] not in spec['groups']:
+            fail('unknown region group {}'.format(output['regions']))
+        if output['metric'] in REGION_ANALYSES and 'regions' in output:
+            fail('{} takes a single region'.format(output['metric']))
+
+        chart = output.get('chart')
+        if chart is not None:
+            if chart.get('type') not in CHARTS:
+                fail('chart type must be one of {}'.format(', '.join(CHARTS)))
+            ranked_year = isinstance(chart.get('year'), int)
+            if chart['type'] == 'ranking' and (not ranked_year or 'regions' not in output):
+                fail('ranking charts need a group of regions and the year to show')
+
+    return spec
+
+
+def _candidates(spec, group):
+    """Return the regions a ranked group picks from (None for every region)."""
+
+    among = group.get('among')
+
+    return list(spec['groups'][among]) if isinstance(among, str) else among
+
+
+def output_regions(spec, output, groups=None):
+    """Return the list of regions an output covers (its group resolved). Without resolved
+    groups, a ranked group stands for the candidates it ranks (None for every region).
+    """
+
+    if 'region' in output:
+        return [output['region']]
+    regions = output['regions']
+    if not isinstance(regions, str):
+        return list(regions)
+    if groups is not None:
+        return list(groups[regions])
+
+    group = spec['groups'][regions]
+
+    return _candidates(spec, group) if isinstance(group, dict) else list(group)
+
+
+def resolve_groups(spec, matrices):
+    """Turn every group of a spec into a list of regions, ranking the ranked groups on the
+    Region x Year matrices with partial selection (see region_rank.top_k).
+
+    :param spec: checked spec
+    :param matrices: Region x Year matrices covering the candidates of the ranked groups (None
+        when no region was computed)
+    :return: dictionary of group name to list of regions
+
+    >>> from region_index import RegionIndex
+    >>> regions = RegionIndex(cha.read_cleaned_csv('chicago_housing_all_residential.csv'))
+    >>> spec = check_spec({'name': 'r', 'outputs': [], 'groups': {
+    ...     'sides': load_spec()['groups']['sides'][1:],
+    ...     'priciest': {'top': 2, 'metric': 'ppsf', 'year': 2019, 'among': 'sides'},
+    ...     'cheapest': {'bottom': 1, 'metric': 'ppsf', 'year': 2019, 'among': 'sides'}}})
+    >>> groups = resolve_groups(spec, region_year_metrics(regions))
+    >>> groups['priciest'], groups['cheapest']
+    (['Chicago, IL - Central Chicago', 'Chicago, IL - North Side'], ['Chicago, IL - Far Southeast Side'])
+    """
+
+    groups = {}
+    for name, group in spec['groups'].items():
+        if not isinstance(group, dict):
+            groups[name] = list(group)
+            continue
+        if matrices is None:
+            groups[name] = []
+            continue
+        matrix = matrices[group.get('metric', 'ppsf')]
+        candidates = _candidates(spec, group)
+        if candidates is not None:
+            matrix = matrix.loc[matrix.index.intersection(pd.Index(candidates), sort=False)]
+        if group['year'] not in matrix.columns:
+            groups[name] = []
+            continue
+        ranks = top_k(matrix[[group['year']]], group.get('top', group.get('bottom')), bottom='bottom' in group)
+        groups[name] = list(ranks[group['year']].index)
+
+    return groups
+
+
+def _call(output):
+    """Return the (metric, arguments) of the analysis call behind a per-region output."""
+
+    kwargs = {'region': output['region']}
+    if output['metric'] == 'monthly_sale_share':
+        kwargs['month'] = tuple(output.get('months', range(1, 13)))
+        kwargs['years'] = tuple(output.get('years', (2013, 2018)))
+        kwargs['per_year'] = bool(output.get('per_year', False))
+        kwargs['deoverlap'] = bool(output.get('deoverlap', False))
+
+    return output['metric'], tuple(sorted(kwargs.items()))
+
+
+def plan_reports(specs):
+    """Work out the distinct aggregations behind every output of every spec: the regions
+    whose Region x Year matrices are needed, which are computed together in one grouped pass,
+    the region hierarchies to roll up and the distinct per-region analysis calls.
+
+    :param specs: list of checked specs
+    :return: dictionary with the sorted 'matrix_regions' (None for every region), the hierarchy files to roll up
+        ('rollups') and the list of distinct 'calls'
+    :raises: error if two specs share a name
+
+    >>> spec = {'name': 'a', 'outputs': [
+    ...     {'name': 'p', 'metric': 'ppsf', 'regions': ['Chicago, IL', 'Chicago, IL - The Loop']},
+    ...     {'name': 'u', 'metric': 'units', 'region': 'Chicago, IL'},
+    ...     {'name': 's', 'metric': 'season_activity', 'region': 'Chicago, IL'}]}
+    >>> plan = plan_reports([check_spec(spec), dict(spec, name='b')])
+    >>> plan['matrix_regions'], len(plan['calls'])
+    (['Chicago, IL', 'Chicago, IL - The Loop'], 1)
+    """
+
+    names = [spec['name'] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError('Report names must be unique.')
+
+    matrix_regions = set()
+    every_region = False
+    rollups = set()
+    calls = []
+    for spec in specs:
+        for group in spec['groups'].values():
+            if isinstance(group, dict):
+                candidates = _candidates(spec, group)  # ranked groups are picked off the matrices
+                every_region |= candidates is None
+                matrix_regions.update(candidates or [])
+        for output in spec['outputs']:
+            if output['metric'] in METRICS:
+                regions = output_regions(spec, output)
+                every_region |= regions is None
+                matrix_regions.update(regions or [])
+            elif output['metric'] in ROLLUP_METRICS:
+                rollups.add(spec.get('hierarchy', DEFAULT_TREE))
+            elif _call(output) not in calls:
+                calls.append(_call(output))
+
+    return {'matrix_regions': None if every_region else sorted(matrix_regions), 'rollups': sorted(rollups),
+            'calls': calls}
+
+
+def execute_plan(data, plan, matrices=None):
+    """Run the aggregations of a plan over the data.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param plan: dictionary returned by plan_reports
+    :param matrices: Region x Year matrices of every region already at hand (e.g. from
+        housing_incremental.refresh), used instead of a pass over the data
+    :return: dictionary with the Region x Year 'matrices', the 'rollups' by hierarchy file and
+        the result of every call by call
+    """
+
+    if matrices is None and (plan['matrix_regions'] is None or plan['matrix_regions']):
+        with stage('region_year_metrics', rows_in=getattr(data, 'df', data)) as record:
+            matrices = region_year_metrics(data, plan['matrix_regions'])
+            if record is not None:
+                record.set_rows_out(matrices['ppsf'])
+    rollups = {}
+    for path in plan['rollups']:
+        with stage('region_rollup', rows_in=getattr(data, 'df', data)) as record:
+            rollups[path] = region_rollup(data, load_tree(path))
+            if record is not None:
+                record.set_rows_out(rollups[path].matrix())
+    # the per-region analyses are @profiled and report as stages of their own
+    calls = {call: getattr(cha, call[0])(data, **dict(call[1])) for call in plan['calls']}
+
+    return {'matrices': matrices, 'rollups': rollups, 'calls': calls}
+
+
+def _matrix_result(matrices, metric, region, years):
+    years_from = matrices['ppsf'] if metric == 'ppsf_pct' else None
+    row = year_row(matrices[metric], region, years_from=years_from, name=SERIES_NAMES[metric])
+
+    return _in_years(row, years)
+
+
+def _in_years(row, years):
+    if years is not None:
+        row = row[(row.index >= years[0]) & (row.index <= years[1])]
+
+    return row
+
+
+def run_reports(data, specs, matrices=None):
+    """Compute every output of every spec, running each shared aggregation once.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param specs: list of checked specs
+    :param matrices: Region x Year matrices of every region to read the yearly outputs off,
+        instead of computing them from the data (see execute_plan)
+    :return: dictionary of report name to a dictionary of output name to result. An output
+        over one region is a series (or what its analysis returns), one over a group a
+        dictionary of region to series.
+
+    >>> from region_index import RegionIndex
+    >>> regions = RegionIndex(cha.read_cleaned_csv('chicago_housing_all_residential.csv'))
+    >>> reports = run_reports(regions, [load_spec()])
+    >>> expected = cha.mult_area_perc_by_yr(regions, load_spec()['groups']['sides'])
+    >>> all(reports['default']['perc_by_side'][r].equals(expected[r]) for r in expected)
+    True
+    """
+
+    executed = execute_plan(data, plan_reports(specs), matrices)
+
+    reports = {}
+    for spec in specs:
+        groups = resolve_groups(spec, executed['matrices'])
+        results = {}
+        for output in spec['outputs']:
+            metric = output['metric']
+            if metric in REGION_ANALYSES:
+                results[output['name']] = executed['calls'][_call(output)]
+                continue
+            if metric in ROLLUP_METRICS:
+                rollup = executed['rollups'][spec.get('hierarchy', DEFAULT_TREE)]
+                by_region = {region: _in_years(rollup.node(region, ROLLUP_METRICS[metric]), output.get('years'))
+                             for region in output_regions(spec, output, groups)}
+            else:
+                by_region = {region: _matrix_result(executed['matrices'], metric, region, output.get('years'))
+                             for region in output_regions(spec, output, groups)}
+            results[output['name']] = by_region if 'regions' in output else by_region[output['region']]
+        reports[spec['name']] = results
+
+    return reports
+
+
+def run_report(data, spec):
+    """Compute every output of one spec; see run_reports."""
+
+    return run_reports(data, [spec])[spec['name']]
+
+
+def chart_report(results, spec, df_mort, renderer=None):
+    """Chart every output of a spec that has a chart entry. Files are written under the
+    spec's output_dir (default the working directory).
+
+    :param results: dictionary returned by run_report for the spec
+    :param spec: checked spec
+    :param df_mort: dataframe of 30-year fixed mortgage rate in US, for mort_vs_mppsf charts
+    :param renderer: optional RenderPool the charts are queued on
+    """
+
+    import housing_plots
+
+    out_dir = spec.get('output_dir', '.')
+    os.makedirs(out_dir, exist_ok=True)
+    for output in spec['outputs']:
+        chart = output.get('chart')
+        if chart is None:
+            continue
+        func_name, takes_colors = CHARTS[chart['type']]
+        plot = getattr(housing_plots, func_name)
+        filenm = os.path.join(out_dir, chart['file']) if out_dir != '.' else chart['file']
+        result = results[output['name']]
+        if takes_colors:
+            plot(result, chart.get('colors'), chart['title'], filenm, renderer=renderer)  # None: default colors
+        elif chart['type'] == 'ranking':
+            ranks = pd.Series({region: series.get(chart['year'], np.nan) for region, series in result.items()},
+                              dtype='float64', name=SERIES_NAMES.get(output['metric']))
+            plot(ranks, chart['title'], filenm, colors=chart.get('colors'), renderer=renderer)
+        elif chart['type'] == 'mort_vs_mppsf':
+            plot(result, df_mort, chart['title'], filenm, renderer=renderer)
+        else:
+            plot(result, chart['title'], filenm, renderer=renderer)
@@ -0,0 +1,157 @@
+# housing_server.py
+# Local HTTP server answering analysis queries from a dataset loaded once.
+# Run from the repository root:  python housing_server.py [--port 8590]
+
+
+import argparse
+import json
+import math
+import numbers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import chicago_housing_analysis as cha
+from housing_cache import load_cleaned
+from region_index import RegionIndex
+from region_matrix import region_year_metrics
+
+
+PORT = 8590
+
+
+def _to_json(result):
+    """Turn an analysis result into a JSON serialisable value, with NaN as null. List items
+    other than numbers, e.g. region names, are kept as they are."""
+
+    if isinstance(result, pd.DataFrame):
+        return json.loads(result.reset_index().to_json(orient='records', date_format='iso'))
+    if isinstance(result, pd.Series):
+        return {str(k): (None if pd.isna(v) else float(v)) for k, v in result.items()}
+    if isinstance(result, list):
+        return [v if not isinstance(v, numbers.Number) else None if math.isnan(v) else float(v) for v in result]
+
+    return result
+
+
+def _months(query):
+    return [int(m) for m in query.get('months', ['1,2,3,4,5,6,7,8,9,10,11,12'])[0].split(',')]
+
+
+def _share(regions, query):
+    years = tuple(int(y) for y in query.get('years', ['2013,2018'])[0].split(','))
+    if len(years) != 2:
+        raise ValueError('years must be a first and a last year, e.g. years=2013,2018')
+    return cha.monthly_sale_share(regions, _months(query), region=query.get('region', ['Chicago, IL'])[0],
+                                  years=years, per_year='per_year' in query, deoverlap='deoverlap' in query)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Serves the analysis functions as GET endpoints, e.g.
+    /area_ppsf_by_yr?region=Chicago, IL - Logan Square or
+    /monthly_sale_share?region=Chicago, IL - Logan Square&months=5,6,7&years=2014,2018&deoverlap=1."""
+
+    regions = None  # RegionIndex shared by every request, set by make_server
+
+    endpoints = {
+        'area_ppsf_by_yr': lambda regions, q: cha.area_ppsf_by_yr(regions, q['region'][0]),
+        'monthly_unit_sold_yr': lambda regions, q: cha.monthly_unit_sold_yr(regions, q['region'][0]),
+        'season_activity': lambda regions, q: cha.season_activity(regions, q['region'][0]),
+        'monthly_sale_share': _share,
+        'regions': lambda regions, q: regions.names,
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = self.endpoints.get(url.path.strip('/'))
+        if endpoint is None:
+            return self._send(404, {'error': 'unknown endpoint', 'endpoints': sorted(self.endpoints)})
+
+        try:
+            result = endpoint(self.regions, parse_qs(url.query))
+        except (KeyError, ValueError) as e:
+            return self._send(400, {'error': 'bad query: {}'.format(e)})
+        try:
+            body = _to_json(result)
+        except Exception as e:
+            return self._send(500, {'error': 'cannot serialise the result: {}'.format(e)})
+
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # keep the console quiet under load
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a listen backlog deep enough for bursts of clients."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(df, host='127.0.0.1', port=PORT):
+    """Index a cleaned dataframe, warm the aggregation cache and return a threaded HTTP
+    server answering queries on it (call serve_forever() on it to start serving).
+
+    :param df: cleaned dataframe
+    :param host: interface to listen on
+    :param port: port to listen on (0 picks a free one)
+    :return: QueryServer
+
+    >>> import threading, urllib.request
+    >>> server = make_server(cha.read_cleaned_csv('chicago_housing_all_residential_test.csv'), port=0)
+    >>> thread = threading.Thread(target=server.serve_forever, daemon=True)
+    >>> thread.start()
+    >>> url = 'http://127.0.0.1:{}/monthly_unit_sold_yr?region=Chicago,+IL'.format(server.server_port)
+    >>> json.load(urllib.request.urlopen(url))
+    {'2014': 1724.0}
+    >>> try:
+    ...     urllib.request.urlopen(url.replace('monthly_unit_sold_yr', 'monthly_sale_share') + '&years=2014')
+    ... except urllib.error.HTTPError as e:
+    ...     e.code, json.load(e)['error']
+    (400, 'bad query: years must be a first and a last year, e.g. years=2013,2018')
+    >>> url = 'http://127.0.0.1:{}/regions'.format(server.server_port)
+    >>> json.load(urllib.request.urlopen(url))
+    ['Chicago, IL', 'Chicago, IL - Albany Park', 'Chicago, IL - Southwest Side', 'Chicago, IL metro area']
+    >>> server.shutdown()
+    >>> server.server_close()
+    """
+
+    regions = RegionIndex(df)
+    region_year_metrics(regions)  # every per-region query is then a cache read
+
+    handler = type('BoundQueryHandler', (QueryHandler,), {'regions': regions})
+
+    return QueryServer((host, port), handler)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Serve Chicago housing analysis queries over HTTP')
+    parser.add_argument('--csv', default='chicago_housing_all_residential.csv', help='Redfin CSV to load')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    df_all = load_cleaned(args.csv, cha.read_cleaned_csv, cha.CLEANING_VERSION)
+    server = make_server(df_all, args.host, args.port)
+    print('serving {} rows on http://{}:{}'.format(len(df_all), args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
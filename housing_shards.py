@@ -0,0 +1,242 @@
+# housing_shards.py
+# Sharded run over a nationwide Redfin export: the rows are split by (metro, property type),
+# every shard is cleaned and analysed in a pool of worker processes, and the shard results
+# are merged into one combined output.
+# Run from the repository root:  python housing_shards.py national.csv [--workers 8] [--export-dir out]
+
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from chicago_housing_analysis import COLUMN_SCHEMA, COMPACT_COLUMNS, df_cleaning
+from housing_export import FORMATS, export_results
+from mortgage_alignment import lagged_rate_correlation, read_mortgage_csv
+from region_index import RegionIndex
+from region_matrix import region_month_share, region_year_metrics
+
+
+WORKERS_ENV = 'HOUSING_SHARD_WORKERS'
+
+# mortgage series mapped from shared memory, set in each worker by _init_worker
+_SHARED = None
+_RATES = None
+
+
+def metro_of(region):
+    """Return the metro a Redfin region belongs to.
+
+    >>> metro_of('Chicago, IL - Lake View'), metro_of('Chicago, IL metro area'), metro_of('Chicago, IL')
+    ('Chicago, IL', 'Chicago, IL', 'Chicago, IL')
+    """
+
+    metro = region.split(' - ')[0]
+
+    return metro[:-len(' metro area')] if metro.endswith(' metro area') else metro
+
+
+def partition(raw):
+    """Split uncleaned rows into (metro, property type) shards, largest first so the longest
+    shards start early. Each shard keeps only the categories it uses.
+
+    :param raw: uncleaned dataframe read with COLUMN_SCHEMA
+    :return: dictionary of (metro, property type) to dataframe
+
+    >>> raw = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',', dtype=COLUMN_SCHEMA)
+    >>> {key: len(shard) for key, shard in partition(raw).items()}
+    {('Chicago, IL', 'All Residential'): 6}
+    """
+
+    regions = raw['Region'].astype('category')
+    metros = np.asarray(regions.cat.categories.map(metro_of), dtype=object)[regions.cat.codes.to_numpy()]
+    positions = raw.groupby([metros, raw['Property Type'].astype(str).to_numpy()], sort=False).indices
+
+    shards = {}
+    for key, rows in sorted(positions.items(), key=lambda item: -len(item[1])):
+        shard = raw.iloc[rows].reset_index(drop=True)
+        for col in shard.select_dtypes('category').columns:
+            shard[col] = shard[col].cat.remove_unused_categories()
+        shards[key] = shard
+
+    return shards
+
+
+def share_rates(df_rate):
+    """Copy the mortgage series into a new shared memory block (the dates as datetime64[ns]
+    followed by the rates as float64), so workers map it instead of each receiving a copy.
+    The caller must close and unlink the block.
+
+    :param df_rate: dataframe returned by read_mortgage_csv
+    :return: (SharedMemory, number of readings)
+    """
+
+    n = len(df_rate)
+    shm = shared_memory.SharedMemory(create=True, size=max(16 * n, 1))
+    dates, rates = _rate_views(shm, n)
+    dates[:] = df_rate['DATE'].to_numpy(dtype='datetime64[ns]')
+    rates[:] = df_rate['MORTGAGE30US'].to_numpy(dtype='float64')
+
+    return shm, n
+
+
+def _rate_views(shm, n):
+    dates = np.ndarray((n,), dtype='datetime64[ns]', buffer=shm.buf)
+    rates = np.ndarray((n,), dtype='float64', buffer=shm.buf, offset=8 * n)
+
+    return dates, rates
+
+
+def attach_rates(name, n):
+    """Map a mortgage series shared by share_rates.
+
+    :param name: name of the shared memory block
+    :param n: number of readings
+    :return: (SharedMemory, dataframe like read_mortgage_csv's over the shared block); the
+        SharedMemory must stay open while the dataframe is used
+
+    >>> shm, n = share_rates(read_mortgage_csv('MORTGAGE30US.csv'))
+    >>> attached, df_rate = attach_rates(shm.name, n)
+    >>> df_rate.equals(read_mortgage_csv('MORTGAGE30US.csv'))
+    True
+    >>> del df_rate; attached.close(); shm.close(); shm.unlink()
+    """
+
+    # workers share the creating process's resource tracker, so attaching registers nothing new
+    shm = shared_memory.SharedMemory(name=name)
+    dates, rates = _rate_views(shm, n)
+
+    return shm, pd.DataFrame({'DATE': dates, 'MORTGAGE30US': rates}, copy=False)
+
+
+def _init_worker(name, n):
+    global _SHARED, _RATES
+    _SHARED, _RATES = attach_rates(name, n)
+
+
+def run_shard(key, raw, df_rate, share_years=(2013, 2018), lags=range(13)):
+    """Clean one shard and run the aggregation suite on it.
+
+    :param key: (metro, property type) of the shard
+    :param raw: uncleaned rows of the shard
+    :param df_rate: dataframe returned by read_mortgage_csv
+    :param share_years: (first, last) year of the monthly sale share
+    :param lags: lags of the mortgage rate correlation
+    :return: (key, dictionary of result name to dataframe, dictionary of shard timings)
+    """
+
+    start = time.perf_counter()
+    df = df_cleaning(raw)
+    cleaned = time.perf_counter()
+
+    # every shard is analysed exactly once, so the memo cache would only cost a hashing pass
+    regions = RegionIndex(df)
+    results = dict(region_year_metrics.__wrapped__(regions))
+    results['sale_share'] = region_month_share.__wrapped__(regions, years=tuple(share_years))
+    corr = lagged_rate_correlation(df, df_rate, lags=lags)
+    results['rate_corr_ppsf'] = corr['Median Sale Ppsf']
+    results['rate_corr_sold'] = corr['Homes Sold']
+    done = time.perf_counter()
+
+    timing = {'metro': key[0], 'property_type': key[1], 'rows': len(df), 'regions': len(regions),
+              'clean_s': cleaned - start, 'aggregate_s': done - cleaned, 'total_s': done - start,
+              'pid': os.getpid()}
+
+    return key, results, timing
+
+
+def _run_shared_shard(key, raw, share_years, lags):
+    return run_shard(key, raw, _RATES, share_years, lags)
+
+
+def merge_results(outputs):
+    """Stack the results of every shard into one dataframe per result, indexed by
+    (Metro, Property Type, Region).
+
+    :param outputs: list of run_shard return values
+    :return: dictionary of result name to dataframe, plus the per shard 'shard_timing'
+    """
+
+    merged = {}
+    for name in outputs[0][1] if outputs else []:
+        merged[name] = pd.concat({key: results[name] for key, results, _ in outputs},
+                                 names=['Metro', 'Property Type'])
+    timings = pd.DataFrame([timing for _, _, timing in outputs])
+    merged['shard_timing'] = timings.set_index(['metro', 'property_type']) if len(timings) else timings
+
+    return merged
+
+
+def run_sharded(filenm, mortgage_csv='MORTGAGE30US.csv', workers=None, share_years=(2013, 2018), lags=range(13)):
+    """Partition a Redfin CSV by (metro, property type) and analyse the shards across worker
+    processes. The mortgage series is placed in shared memory once for every worker.
+
+    :param filenm: path of the Redfin CSV
+    :param mortgage_csv: path of the FRED MORTGAGE30US CSV
+    :param workers: number of worker processes (defaults to the HOUSING_SHARD_WORKERS
+        environment variable, then the CPU count); 0 runs the shards in this process
+    :param share_years: (first, last) year of the monthly sale share
+    :param lags: lags of the mortgage rate correlation
+    :return: dictionary returned by merge_results
+
+    >>> merged = run_sharded('chicago_housing_all_residential_test.csv', workers=0)
+    >>> pooled = run_sharded('chicago_housing_all_residential_test.csv', workers=1)
+    >>> merged['units'].loc[('Chicago, IL', 'All Residential', 'Chicago, IL'), 2014]
+    1724.0
+    >>> all(merged[name].equals(pooled[name]) for name in merged if name != 'shard_timing')
+    True
+    """
+
+    if workers is None:
+        workers = int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1))
+    lags = tuple(lags)
+
+    dtype = {col: COLUMN_SCHEMA[col] for col in COMPACT_COLUMNS}
+    shards = partition(pd.read_csv(filenm, sep=',', usecols=COMPACT_COLUMNS, dtype=dtype))
+    df_rate = read_mortgage_csv(mortgage_csv)
+
+    if workers == 0:
+        return merge_results([run_shard(key, raw, df_rate, share_years, lags) for key, raw in shards.items()])
+
+    shm, n = share_rates(df_rate)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, n)) as pool:
+            futures = [pool.submit(_run_shared_shard, key, raw, share_years, lags) for key, raw in shards.items()]
+            outputs = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return merge_results(outputs)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Run the housing analysis per (metro, property type) shard')
+    parser.add_argument('csv', nargs='?', default='chicago_housing_all_residential.csv', help='Redfin CSV to load')
+    parser.add_argument('--mortgage', default='MORTGAGE30US.csv', help='FRED MORTGAGE30US CSV')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--export-dir', metavar='DIR', help='write the merged results as data files to DIR')
+    parser.add_argument('--export-format', choices=FORMATS, default='csv', help='format of the exported results')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    merged = run_sharded(args.csv, args.mortgage, args.workers)
+    wall = time.perf_counter() - start
+
+    timing = merged['shard_timing']
+    print(timing.sort_values('total_s', ascending=False).head(20).to_string(float_format='{:.3f}'.format))
+    busy = timing['total_s'].sum() if len(timing) else 0.0
+    print('{} shards, {:.2f} s wall, {:.2f} s of shard work ({:.1f}x parallel)'.format(
+        len(timing), wall, busy, busy / wall if wall else 0.0))
+
+    if args.export_dir:
+        export_results(merged, args.export_dir, args.export_format)
+
+
+if __name__ == '__main__':
+    main()
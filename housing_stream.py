@@ -0,0 +1,93 @@
+# housing_stream.py
+# Chunked pipeline for Redfin CSVs that don't fit in memory.
+
+
+import pandas as pd
+
+from chicago_housing_analysis import COLUMN_SCHEMA, df_cleaning
+from housing_incremental import AggregateState
+
+
+STREAM_COLUMNS = ['Property Type', 'Region', 'Homes Sold', 'Median Sale Ppsf', 'Median Sale Price',
+                  'Period Begin', 'Period End']
+
+
+class SaleShareAggregator:
+    """Running Homes Sold totals per (Region, Month) inside a year window, the streaming
+    counterpart of monthly_sale_share (whose window is the years after 2012 and before 2019)."""
+
+    def __init__(self, first_year=2013, last_year=2018):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.sold = None
+
+    def add(self, df):
+        """Add the Homes Sold of a cleaned chunk to the running totals."""
+
+        df = df[(df['Year'] >= self.first_year) & (df['Year'] <= self.last_year)]
+        sold = df['Homes Sold'].astype('float64').groupby([df['Region'].astype(str), df['Month']]).sum()
+        self.sold = sold if self.sold is None else self.sold.add(sold, fill_value=0)
+
+    def shares(self):
+        """Return the Region x Month matrix of each month's share of the region's homes sold."""
+
+        if self.sold is None or len(self.sold) == 0:
+            return pd.DataFrame(columns=pd.RangeIndex(1, 13, name='Month'))
+        sold = self.sold.unstack('Month').reindex(columns=range(1, 13)).fillna(0)
+        sold.index.name = 'Region'
+        sold.columns.name = 'Month'
+
+        return sold.div(sold.sum(axis=1), axis=0)
+
+
+def stream_aggregates(filenm, region_list=None, property_types=('All Residential',), chunksize=100000,
+                      share_years=(2013, 2018)):
+    """Read a Redfin CSV chunk by chunk, keep only the requested regions and property types
+    before cleaning, and feed the rows to running aggregators. Only one chunk of rows is held
+    at a time, but the exact yearly medians need every Median Sale Ppsf reading kept, at 12
+    bytes each (see housing_incremental.AggregateState). Peak memory therefore still grows
+    with the number of rows kept, far slower than a full load of the file.
+
+    :param filenm: path of the CSV
+    :param region_list: regions to keep, or None for every region
+    :param property_types: property types to keep, or None for every property type
+    :param chunksize: number of CSV rows parsed at a time
+    :param share_years: (first, last) year included in the monthly sale share
+    :return: dictionary with the Region x Year matrices of region_matrix.region_year_metrics
+        (ppsf, ppsf_pct, units) plus the Region x Month sale_share matrix
+
+    >>> metrics = stream_aggregates('chicago_housing_all_residential_test.csv', chunksize=2)
+    >>> round(metrics['ppsf'].loc['Chicago, IL - Albany Park', 2019], 2)
+    198.89
+    >>> metrics['units'].loc['Chicago, IL', 2014]
+    1724.0
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> metrics = stream_aggregates('chicago_housing_all_residential.csv', ['Chicago, IL'], chunksize=5000)
+    >>> shares = chicago_housing_analysis.monthly_sale_share(df_all, range(1, 13))
+    >>> max(abs(a - b) for a, b in zip(metrics['sale_share'].loc['Chicago, IL'], shares)) < 1e-12
+    True
+    """
+
+    state = AggregateState()
+    share = SaleShareAggregator(*share_years)
+
+    dtype = {col: COLUMN_SCHEMA[col] for col in STREAM_COLUMNS}
+    for chunk in pd.read_csv(filenm, sep=',', usecols=STREAM_COLUMNS, dtype=dtype, chunksize=chunksize):
+        keep = pd.Series(True, index=chunk.index)
+        if region_list is not None:
+            keep &= chunk['Region'].isin(region_list)
+        if property_types is not None:
+            keep &= chunk['Property Type'].isin(property_types)
+        chunk = chunk[keep]
+        if len(chunk) == 0:
+            continue
+
+        chunk = df_cleaning(chunk.copy())
+        state.add(chunk)
+        share.add(chunk)
+
+    metrics = state.metrics()
+    metrics['sale_share'] = share.shares()
+
+    return metrics
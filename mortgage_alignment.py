@@ -0,0 +1,118 @@
+# mortgage_alignment.py
+# Aligns the weekly FRED 30-year mortgage rate with the Redfin rolling periods.
+
+
+import numpy as np
+import pandas as pd
+
+
+def read_mortgage_csv(filenm):
+    """Read the FRED MORTGAGE30US export, sorted by date.
+
+    :param filenm: path of the CSV
+    :return: dataframe with DATE (datetime) and MORTGAGE30US (percent) columns
+
+    >>> df_mort = read_mortgage_csv('MORTGAGE30US.csv')
+    >>> df_mort['DATE'].is_monotonic_increasing
+    True
+    """
+
+    df_rate = pd.read_csv(filenm, sep=',')
+    df_rate['DATE'] = pd.to_datetime(df_rate['DATE'], format='%m/%d/%Y')
+
+    return df_rate.sort_values('DATE', ignore_index=True)
+
+
+def window_rate_average(df, df_rate):
+    """Average the weekly mortgage rate over each row's Redfin period, Period Begin through
+    Period End (the Period Duration days of the rolling window). The join is vectorized: the
+    window bounds are located in the sorted rate dates with a binary search and the average
+    comes from a prefix sum, so no row is looped over in Python.
+
+    :param df: cleaned Redfin dataframe
+    :param df_rate: dataframe returned by read_mortgage_csv
+    :return: series of the average rate in each row's window (NaN if no weekly reading
+        falls inside it), aligned with df
+
+    >>> df_rate = pd.DataFrame({'DATE': pd.to_datetime(['2014-01-02', '2014-01-09', '2014-02-06']),
+    ...                         'MORTGAGE30US': [4.0, 5.0, 9.0]})
+    >>> df = pd.DataFrame({'Period Begin': pd.to_datetime(['2014-01-01', '2014-03-01']),
+    ...                    'Period End': pd.to_datetime(['2014-01-31', '2014-03-31'])})
+    >>> window_rate_average(df, df_rate).tolist()
+    [4.5, nan]
+    """
+
+    dates = df_rate['DATE'].to_numpy()
+    prefix = np.concatenate([[0.0], np.cumsum(df_rate['MORTGAGE30US'].to_numpy(dtype='float64'))])
+
+    lo = np.searchsorted(dates, df['Period Begin'].to_numpy(), side='left')
+    hi = np.searchsorted(dates, df['Period End'].to_numpy(), side='right')
+    count = hi - lo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = np.where(count > 0, (prefix[hi] - prefix[lo]) / count, np.nan)
+
+    return pd.Series(average, index=df.index, name='MORTGAGE30US')
+
+
+def _batched_corr(x, y, min_periods):
+    """Pearson correlation along axis -2 of two equally shaped arrays, ignoring NaN pairs."""
+
+    valid = ~(np.isnan(x) | np.isnan(y))
+    n = valid.sum(axis=-2)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = x.sum(axis=-2) / n
+        mean_y = y.sum(axis=-2) / n
+        dx = np.where(valid, x - mean_x[..., None, :], 0.0)
+        dy = np.where(valid, y - mean_y[..., None, :], 0.0)
+        corr = (dx * dy).sum(axis=-2) / np.sqrt((dx * dx).sum(axis=-2) * (dy * dy).sum(axis=-2))
+
+    return np.where(n >= min_periods, corr, np.nan)
+
+
+def lagged_rate_correlation(df, df_rate, metrics=('Median Sale Ppsf', 'Homes Sold'), lags=range(13),
+                            min_periods=12):
+    """Correlate the window averaged mortgage rate with Redfin metrics for every region and
+    every lag in one batched operation. At lag k a region's metric for a period is paired
+    with the rate of the period k steps earlier (Redfin periods start a month apart).
+
+    :param df: cleaned Redfin dataframe
+    :param df_rate: dataframe returned by read_mortgage_csv
+    :param metrics: Redfin columns to correlate with the rate
+    :param lags: lags, in periods, to compute
+    :param min_periods: fewest paired periods for a correlation to be reported
+    :return: dictionary of metric to a Region x Lag dataframe of correlations
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> df_rate = read_mortgage_csv('MORTGAGE30US.csv')
+    >>> corr = lagged_rate_correlation(df_all, df_rate, lags=[0, 6])
+    >>> chi = df_all[df_all['Region'] == 'Chicago, IL']
+    >>> expected = chi['Median Sale Ppsf'].corr(window_rate_average(chi, df_rate))
+    >>> bool(abs(corr['Median Sale Ppsf'].loc['Chicago, IL', 0] - expected) < 1e-9)
+    True
+    """
+
+    lags = list(lags)
+    rate = window_rate_average(df, df_rate)
+    keys = [df['Period Begin'], df['Region'].astype(str)]
+
+    # Period x Region matrices; every region shares the same row per period start
+    rate_matrix = rate.groupby(keys).mean().unstack()
+    periods = rate_matrix.index
+    regions = rate_matrix.columns
+
+    # lags x periods x regions stack of the rate, shifted down by each lag
+    shifted = np.stack([rate_matrix.shift(lag).to_numpy() for lag in lags])
+
+    result = {}
+    for metric in metrics:
+        values = df[metric].astype('float64').groupby(keys).mean().unstack()
+        values = values.reindex(index=periods, columns=regions).to_numpy()
+        corr = _batched_corr(np.broadcast_to(values, shifted.shape), shifted, min_periods)
+        result[metric] = pd.DataFrame(corr.T, index=pd.Index(regions, name='Region'),
+                                      columns=pd.Index(lags, name='Lag'))
+
+    return result
@@ -0,0 +1,199 @@
+# region_bootstrap.py
+# Bootstrap confidence intervals of every region's yearly median Ppsf and its % change
+# against the previous year, resampled for all regions and years at once.
+
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from housing_memo import memoized
+from region_index import regions_rows
+
+
+def _group_values(df):
+    """Lay the Median Sale Ppsf readings of every (Region, Year) out for resampling.
+
+    :return: (Region index, Year columns, layout of the readings: the flat (Region, Year) cell
+        number of every cell with readings, where its readings start, how many it has, and the
+        readings of every cell one after the other)
+    """
+
+    # the same rows and columns as region_year_metrics, which spans the years of every row
+    index = pd.Index(sorted(df['Region'].astype(str).unique()), name='Region')
+    years = range(int(df['Year'].min()), int(df['Year'].max()) + 1) if len(df) else range(0)
+    columns = pd.Index(years, name='Year')
+
+    df = df.loc[df['Median Sale Ppsf'].notna(), ['Region', 'Year', 'Median Sale Ppsf']]
+    cell = index.get_indexer(df['Region'].astype(str)) * len(columns) + (df['Year'].to_numpy() - years.start)
+    order = np.argsort(cell, kind='stable')
+    cell, values = cell[order], df['Median Sale Ppsf'].to_numpy(dtype='float64')[order]
+    cells, starts, counts = np.unique(cell, return_index=True, return_counts=True)
+
+    # float32 is ample for interval bounds and halves the memory the draws move through
+    return index, columns, (cells, starts, counts, values.astype('float32'))
+
+
+def _resample_chunk(layout, n_cells, width, streams, resamples):
+    """Bootstrap medians of every cell and their % change against the previous year's cell,
+    for one chunk of resamples.
+
+    :param layout: readings of _group_values, their cell numbers and starts counted from the
+        block's first
+    :param streams: (generator, first reading, end reading) of every region, each region's
+        draws coming from its own generator
+    :return: (resamples x cells medians, resamples x cells % changes)
+    """
+
+    cells, starts, counts, values = layout
+    uniform = np.empty((resamples, len(values)), dtype='float32')
+    for rng, lo, hi in streams:
+        uniform[:, lo:hi] = rng.random((resamples, hi - lo), dtype=np.float32)
+
+    # every reading slot draws one of the readings of its own cell
+    picks = np.repeat(starts, counts) + (uniform * np.repeat(counts, counts)).astype(np.intp)
+    drawn = values[picks]
+
+    # cells of equal size are sorted together, so no cell is padded to the largest one
+    medians = np.full((resamples, n_cells), np.nan, dtype='float32')
+    for n in np.unique(counts):
+        which = counts == n
+        group = np.sort(drawn[:, starts[which][:, None] + np.arange(n)], axis=2)
+        medians[:, cells[which]] = (group[..., (n - 1) // 2] + group[..., n // 2]) / 2
+
+    # the previous year of a cell is the cell before it, unless it starts a region's row
+    pct = np.full_like(medians, np.nan)
+    follows = np.arange(1, n_cells)[np.arange(1, n_cells) % width != 0]
+    pct[:, follows] = (medians[:, follows] / medians[:, follows - 1] - 1) * 100
+
+    return medians, pct
+
+
+def _block_intervals(layout, cells, width, first_region, entropy, resamples, chunk, tails):
+    """Percentile bounds of the cells of one block of regions, from every resample of the
+    block drawn chunk by chunk; only the block's draws are ever held in memory.
+
+    :param layout: readings of _group_values, their cell numbers and starts counted from the
+        block's first
+    :param cells: number of cells in the block (its regions x width)
+    :param first_region: position of the block's first region among every region
+    :param entropy: entropy of the root SeedSequence; region i draws from its i-th child
+    :param tails: (lower, upper) percentiles
+    :return: dictionary of ppsf and ppsf_pct to a 2 x cells array of the lower and upper bounds
+    """
+
+    # one generator per region with readings, keyed on the region's position so neither the
+    # block size nor the number of workers changes what a region draws
+    cells_with_readings, starts, _, values = layout
+    region = cells_with_readings // width
+    firsts = np.flatnonzero(np.r_[True, region[1:] != region[:-1]]) if len(region) else np.empty(0, dtype=int)
+    ends = np.r_[starts[firsts[1:]], len(values)] if len(firsts) else []
+    streams = [(np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(first_region + int(r),))), lo, hi)
+               for r, lo, hi in zip(region[firsts], starts[firsts], ends)]
+
+    starts = range(0, resamples, chunk)
+    sizes = [min(chunk, resamples - start) for start in starts]
+
+    # each cell's draws lie contiguous, so the percentile partitions run along rows in place
+    draws = {name: np.full((cells, max(resamples, 1)), np.nan, dtype='float32') for name in ('ppsf', 'ppsf_pct')}
+    for start, size in zip(starts, sizes):
+        medians, pct = _resample_chunk(layout, cells, width, streams, size)
+        draws['ppsf'][:, start:start + size] = medians.T
+        draws['ppsf_pct'][:, start:start + size] = pct.T
+
+    bounds = {}
+    for name, matrix in draws.items():
+        with np.errstate(invalid='ignore'):
+            bounds[name] = np.percentile(matrix, tails, axis=1, overwrite_input=True)
+
+    return bounds
+
+
+@memoized
+def bootstrap_intervals(data, resamples=10000, level=0.95, seed=0, region_list=None, workers=0, chunk=250,
+                        block=64):
+    """Percentile bootstrap confidence intervals of the yearly metrics of region_year_metrics:
+
+    * ppsf: median Median Sale Ppsf of the region's periods in the year
+    * ppsf_pct: % change of ppsf against the previous calendar year, from the same resample
+      of both years
+
+    The regions are taken block regions at a time. Every resample of every (Region, Year) of
+    a block is drawn into one NumPy index matrix, chunk resamples at a time, and the cells
+    with the same number of readings take their medians together, so the only Python loop
+    over regions fills each region's uniform draws. The block's draws are reduced to their
+    percentiles before the next block starts: memory grows with block x resamples, not with
+    the number of regions. Region i draws from the i-th child of SeedSequence(seed), one
+    generator carried across its chunks, so a seed gives the same intervals whatever the
+    block and chunk sizes or the number of workers.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param resamples: number of bootstrap resamples
+    :param level: confidence level of the intervals
+    :param seed: seed of the resamples
+    :param region_list: regions to compute, or None for every region in the data
+    :param workers: number of processes to spread the blocks across; 0 draws them in this
+        process
+    :param chunk: resamples drawn at a time, bounding the memory of the index matrices
+    :param block: regions resampled together, bounding the memory of the draws
+    :return: dictionary of ppsf, ppsf_lower, ppsf_upper, ppsf_pct, ppsf_pct_lower and
+        ppsf_pct_upper to Region x Year dataframes; the point estimates are those of
+        region_year_metrics
+
+    >>> import chicago_housing_analysis, region_matrix
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> ci = bootstrap_intervals(df_all, resamples=2000)
+    >>> ci['ppsf'].equals(region_matrix.region_year_matrix(df_all, 'ppsf'))
+    True
+    >>> [round(ci[name].loc['Chicago, IL', 2019], 2) for name in ('ppsf_pct_lower', 'ppsf_pct', 'ppsf_pct_upper')]
+    [-7.71, 2.32, 16.25]
+    >>> pooled = bootstrap_intervals(df_all, resamples=2000, workers=2)
+    >>> all(pooled[name].equals(ci[name]) for name in ci)
+    True
+    >>> blocked = bootstrap_intervals(df_all, resamples=2000, block=7, chunk=300)
+    >>> all(blocked[name].equals(ci[name]) for name in ci)
+    True
+    """
+
+    df = regions_rows(data, region_list)
+    index, columns, layout = _group_values(df)
+    width = len(columns)
+
+    # the readings of every block of regions, with cell numbers and starts counted from the block's first
+    cells, starts, counts, values = layout
+    edges = [(lo, min(lo + block, len(index))) for lo in range(0, len(index), block)]
+    layouts = []
+    for lo, hi in edges:
+        first, last = np.searchsorted(cells, [lo * width, hi * width])
+        offset = starts[first] if first < len(starts) else len(values)
+        end = starts[last] if last < len(starts) else len(values)
+        layouts.append((cells[first:last] - lo * width, starts[first:last] - offset, counts[first:last],
+                        values[offset:end]))
+
+    tail = (1 - level) / 2 * 100
+    n_blocks = len(edges)
+    arguments = [layouts, [(hi - lo) * width for lo, hi in edges], [width] * n_blocks, [lo for lo, _ in edges],
+                 [np.random.SeedSequence(seed).entropy] * n_blocks, [resamples] * n_blocks, [chunk] * n_blocks,
+                 [(tail, 100 - tail)] * n_blocks]
+    if workers == 0:
+        bounds = list(map(_block_intervals, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            bounds = list(pool.map(_block_intervals, *arguments))
+
+    intervals = {}
+    for name in ('ppsf', 'ppsf_pct'):
+        both = np.concatenate([b[name] for b in bounds], axis=1) if bounds else np.empty((2, 0))
+        for k, suffix in enumerate(('_lower', '_upper')):
+            intervals[name + suffix] = pd.DataFrame(both[k].reshape(len(index), width).astype('float64'),
+                                                    index=index, columns=columns)
+
+    ppsf = df.groupby(['Region', 'Year'], observed=True)['Median Sale Ppsf'].median().unstack('Year')
+    ppsf.index = ppsf.index.astype(str)
+    ppsf = ppsf.reindex(index=index, columns=columns)
+    intervals['ppsf'] = ppsf
+    intervals['ppsf_pct'] = (ppsf / ppsf.shift(1, axis=1) - 1) * 100
+
+    return {name: intervals[name] for name in ('ppsf', 'ppsf_lower', 'ppsf_upper',
+                                               'ppsf_pct', 'ppsf_pct_lower', 'ppsf_pct_upper')}
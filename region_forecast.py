@@ -0,0 +1,188 @@
+# region_forecast.py
+# Seasonal trend forecasts of Median Sale Ppsf and Homes Sold for every region at once, fitted
+# by stacked least squares over the Region x Period matrices.
+
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from housing_memo import memoized
+from region_matrix import solve_by_pattern
+from region_rolling import region_period_matrix
+
+
+# forecast metric names and the columns they are fitted on, named as in region_year_metrics
+FORECAST_COLUMNS = {'ppsf': 'Median Sale Ppsf', 'units': 'Homes Sold'}
+
+
+def seasonal_design(periods, origin):
+    """Design matrix of a linear trend plus month-of-year seasonality: an intercept, the years
+    since origin and a dummy for each month but January.
+
+    :param periods: DatetimeIndex of month starts
+    :param origin: Timestamp the trend is measured from
+    :return: Period x 13 array
+
+    >>> seasonal_design(pd.date_range('2019-01-01', periods=3, freq='MS'), pd.Timestamp('2019-01-01'))[:, :4]
+    array([[1.        , 0.        , 0.        , 0.        ],
+           [1.        , 0.08333333, 1.        , 0.        ],
+           [1.        , 0.16666667, 0.        , 1.        ]])
+    """
+
+    months = (periods.year - origin.year) * 12 + (periods.month - origin.month)
+    seasons = (np.asarray(periods.month)[:, None] == np.arange(2, 13)).astype('float64')
+
+    return np.column_stack([np.ones(len(periods)), np.asarray(months) / 12, seasons])
+
+
+def fit_seasonal_trend(y, design, future, level=0.95, mean_of=None, observed=None):
+    """Fit the columns of a Period x Series matrix to a shared design matrix by least squares
+    and forecast the future rows, the series sharing a pattern of missing periods solved
+    together (see region_matrix.solve_by_pattern). A series is left NaN when its periods
+    cannot identify every coefficient.
+
+    The intervals are normal prediction intervals from each series' residual variance,
+    sigma^2 (1 + x (X'X)^-1 x'), for every future row and for the mean of a set of them. When
+    observed values share the mean with the future rows, e.g. the months of a year already in
+    the data, they enter the mean as they are and only the forecast part adds to its interval.
+
+    :param y: Period x Series array, NaN where a series has no period
+    :param design: Period x Coefficient array
+    :param future: Future period x Coefficient array
+    :param level: coverage of the prediction intervals
+    :param mean_of: boolean mask of the future rows to average (default all of them)
+    :param observed: (sum, count) arrays, one value per series, of observed values averaged
+        along with the masked future rows (default none)
+    :return: dictionary of forecast, lower and upper (Future period x Series arrays) and
+        mean, mean_lower and mean_upper (the mean over the masked future rows and the observed
+        values, one per series)
+
+    >>> design = np.column_stack([np.ones(6), np.arange(6)])
+    >>> y = np.array([[1.0, 2.0, 3.0, 4.0, 5.0, 6.0], [2.0, 2.0, 2.0, 2.0, np.nan, 2.0]]).T
+    >>> fit = fit_seasonal_trend(y, design, np.array([[1.0, 6.0], [1.0, 7.0]]))
+    >>> fit['forecast'].round(6).tolist(), fit['mean_upper'].round(6).tolist()
+    ([[7.0, 2.0], [8.0, 2.0]], [7.5, 2.0])
+    >>> fit = fit_seasonal_trend(y, design, np.array([[1.0, 6.0], [1.0, 7.0]]),
+    ...                          observed=(np.array([11.0, 4.0]), np.array([2, 2])))
+    >>> fit['mean'].round(6).tolist(), fit['mean_upper'].round(6).tolist()
+    ([6.5, 2.0], [6.5, 2.0])
+    >>> fit_seasonal_trend(y, design, np.array([[1.0, 6.0]]), mean_of=np.array([False]))
+    Traceback (most recent call last):
+    ...
+    ValueError: The mean must cover at least one future row.
+    """
+
+    y = np.asarray(y, dtype='float64')
+    n_coef = design.shape[1]
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    n_mean = len(future) if mean_of is None else int(np.sum(mean_of))
+    if n_mean == 0:
+        raise ValueError('The mean must cover at least one future row.')
+    average = future[np.ones(len(future), dtype=bool) if mean_of is None else mean_of].mean(axis=0)
+    observed_sum, observed_count = (np.zeros(y.shape[1]), np.zeros(y.shape[1])) if observed is None else (
+        np.asarray(part, dtype='float64') for part in observed)
+    n_total = n_mean + observed_count
+
+    fit = {name: np.full((len(future), y.shape[1]), np.nan) for name in ('forecast', 'lower', 'upper')}
+    fit.update({name: np.full(y.shape[1], np.nan) for name in ('mean', 'mean_lower', 'mean_upper')})
+
+    for rows, columns, coef, rank in solve_by_pattern(design, y):
+        x = design[rows]
+        if rows.sum() <= n_coef or rank < n_coef:
+            continue
+        residuals = y[np.ix_(rows, columns)] - x @ coef
+        sigma2 = (residuals ** 2).sum(axis=0) / (rows.sum() - n_coef)
+
+        inverse = np.linalg.inv(x.T @ x)
+        leverage = np.einsum('ij,jk,ik->i', future, inverse, future)
+        spread = z * np.sqrt(np.outer(1 + leverage, sigma2))
+        forecast = future @ coef
+        fit['forecast'][:, columns] = forecast
+        fit['lower'][:, columns] = forecast - spread
+        fit['upper'][:, columns] = forecast + spread
+
+        # the mean of future rows: shared coefficient error, independent noise per row
+        # scaled by the forecast rows' share of the mean when observed values join it
+        share = n_mean / n_total[columns]
+        spread = share * z * np.sqrt((average @ inverse @ average + 1 / n_mean) * sigma2)
+        fit['mean'][columns] = (observed_sum[columns] + n_mean * (average @ coef)) / n_total[columns]
+        fit['mean_lower'][columns] = fit['mean'][columns] - spread
+        fit['mean_upper'][columns] = fit['mean'][columns] + spread
+
+    return fit
+
+
+@memoized
+def forecast_regions(data, year=None, level=0.95, region_list=None):
+    """Forecast every region's Median Sale Ppsf and Homes Sold through the end of a year with
+    a linear trend plus month-of-year seasonality, fitted for all regions by stacked least
+    squares over the Region x Period matrices of region_rolling.region_period_matrix.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param year: last year to forecast (default the year after the last period)
+    :param level: coverage of the prediction intervals
+    :param region_list: regions to forecast, or None for every region in the data
+    :return: dictionary of metric name to dataframe, the metrics being ppsf and units, each
+        also with a _lower and an _upper bound:
+
+        * ppsf, units: Region x Period forecasts of every month from the one after the last
+          period through December of the year
+        * ppsf_year, units_year: Region x Year forecasts of the year's mean monthly value,
+          alongside region_year_metrics (area_ppsf_by_yr takes the median of the monthly Ppsf,
+          the forecast their mean). The months of the year already in the data count as
+          observed and the rest as forecast; the interval only covers the forecast months.
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> forecast = forecast_regions(df_all)
+    >>> forecast['ppsf'].shape
+    (224, 14)
+    >>> bounds = ('ppsf_year_lower', 'ppsf_year', 'ppsf_year_upper')
+    >>> [round(forecast[name].loc['Chicago, IL', 2020], 1) for name in bounds]
+    [209.8, 217.4, 225.1]
+    >>> bool((forecast['units_lower'] <= forecast['units_upper']).all().all())
+    True
+
+    Of 2019 only November and December are forecast, the other months are observed:
+
+    >>> forecast = forecast_regions(df_all, year=2019)
+    >>> forecast['ppsf'].shape
+    (224, 2)
+    >>> [round(forecast[name].loc['Chicago, IL', 2019], 1) for name in bounds]
+    [196.1, 198.8, 201.4]
+
+    A year must have months left to forecast:
+
+    >>> forecast_regions(df_all, year=2018)
+    Traceback (most recent call last):
+    ...
+    ValueError: Every month of 2018 is already observed, there is nothing to forecast.
+    """
+
+    forecasts = {}
+    for name, column in FORECAST_COLUMNS.items():
+        matrix = region_period_matrix(data, column, region_list)
+        periods = matrix.columns
+        if year is None:
+            year = periods[-1].year + 1
+        future = pd.date_range(periods[-1] + pd.DateOffset(months=1), '{}-12-01'.format(year), freq='MS',
+                               name='Period Begin')
+        if not (future.year == year).any():
+            raise ValueError('Every month of {} is already observed, there is nothing to forecast.'.format(year))
+
+        y = matrix.to_numpy().T
+        seen = y[periods.year == year]
+        observed = (np.nansum(seen, axis=0), np.sum(~np.isnan(seen), axis=0))
+        origin = periods[0]
+        fit = fit_seasonal_trend(y, seasonal_design(periods, origin), seasonal_design(future, origin), level,
+                                 mean_of=future.year == year, observed=observed)
+        years = pd.Index([year], name='Year')
+        for suffix in ('', '_lower', '_upper'):
+            forecasts[name + suffix] = pd.DataFrame(fit[suffix[1:] or 'forecast'].T, index=matrix.index,
+                                                    columns=future)
+            forecasts[name + '_year' + suffix] = pd.DataFrame(fit['mean' + suffix][:, None], index=matrix.index,
+                                                              columns=years)
+
+    return forecasts
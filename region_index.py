@@ -0,0 +1,113 @@
+# region_index.py
+# Precomputed row index of the cleaned Redfin dataframe by Region.
+
+
+import numpy as np
+import pandas as pd
+
+
+class RegionIndex:
+    """Row positions of every region in a cleaned dataframe, built with one pass over the
+    Region column. Rows are stably sorted by the categorical Region code and an offsets table
+    marks where each region starts, so looking a region up is a slice instead of a full
+    string comparison over the frame.
+
+    Build it once in main() and pass it to the analysis functions in place of the dataframe.
+
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> regions = RegionIndex(df_all)
+    >>> len(regions)
+    4
+    >>> regions.rows('Chicago, IL - Albany Park')['Homes Sold'].tolist()
+    [100, 107]
+    >>> len(regions.rows('Chicago, IL - Lincoln Park'))
+    0
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+        region = df['Region']
+        if not isinstance(region.dtype, pd.CategoricalDtype):
+            region = region.astype('category')
+        codes = region.cat.codes.to_numpy()
+
+        self.names = list(region.cat.categories)
+        self._lookup = {name: i for i, name in enumerate(self.names)}
+        self._order = np.argsort(codes, kind='stable')
+        self._offsets = np.searchsorted(codes[self._order], np.arange(len(self.names) + 1))
+
+    @classmethod
+    def of(cls, data):
+        """Return data itself if it already is a RegionIndex, otherwise index the dataframe."""
+
+        return data if isinstance(data, cls) else cls(data)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, region):
+        return region in self._lookup
+
+    def positions(self, region):
+        """Return the row positions of a region (empty if the region is not in the data)."""
+
+        i = self._lookup.get(region)
+        if i is None:
+            return self._order[:0]
+
+        return self._order[self._offsets[i]:self._offsets[i + 1]]
+
+    def rows(self, region):
+        """Return the rows of a region, in their original order."""
+
+        return self.df.iloc[self.positions(region)]
+
+    def rows_of(self, region_list):
+        """Return the rows of several regions, grouped region by region."""
+
+        if not region_list:
+            return self.df.iloc[:0]
+
+        return self.df.iloc[np.concatenate([self.positions(i) for i in region_list])]
+
+
+def region_rows(data, region):
+    """Return the rows of one region from either a dataframe or a RegionIndex.
+
+    :param data: cleaned dataframe or a RegionIndex built on it
+    :param region: Specified region/area/community
+    :return: dataframe with only the rows of the region
+
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> len(region_rows(df_all, 'Chicago, IL')) == len(region_rows(RegionIndex(df_all), 'Chicago, IL'))
+    True
+    """
+
+    if isinstance(data, RegionIndex):
+        return data.rows(region)
+
+    return data[data['Region'] == region]
+
+
+def regions_rows(data, region_list=None):
+    """Return the rows of a list of regions (or every row when region_list is None) from
+    either a dataframe or a RegionIndex.
+
+    :param data: cleaned dataframe or a RegionIndex built on it
+    :param region_list: A list of specified regions/areas/communities, or None for all of them
+    :return: dataframe with only the rows of those regions
+
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> area_list = ['Chicago, IL', 'Chicago, IL - Albany Park']
+    >>> len(regions_rows(df_all, area_list)), len(regions_rows(RegionIndex(df_all), area_list))
+    (3, 3)
+    """
+
+    df = data.df if isinstance(data, RegionIndex) else data
+    if region_list is None:
+        return df
+    if isinstance(data, RegionIndex):
+        return data.rows_of(region_list)
+
+    return df[df['Region'].isin(region_list)]
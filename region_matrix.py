@@ -0,0 +1,248 @@
+# region_matrix.py
+# Region x Year matrices of the yearly metrics and Region x Month seasonality matrices,
+# computed for any number of regions in one grouped pass.
+
+
+import numpy as np
+import pandas as pd
+
+from housing_memo import memoized
+from region_index import regions_rows
+
+
+METRICS = ('ppsf', 'ppsf_pct', 'units')
+
+
+@memoized
+def region_year_metrics(data, region_list=None):
+    """Compute every yearly metric as a wide Region x Year dataframe with a single groupby over
+    (Region, Year):
+
+    * ppsf: median Median Sale Ppsf
+    * ppsf_pct: % change of ppsf against the previous calendar year, computed column-wise
+      over the whole matrix
+    * units: average monthly Homes Sold
+
+    A cell is NaN where the region has no rows for that year. Results are memoized per
+    dataset; every call gets its own copy of the matrices.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param region_list: regions to compute, or None for every region in the data
+    :return: dictionary of metric name to Region x Year dataframe
+
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.df_cleaning(df_all)
+    >>> metrics = region_year_metrics(df_all)
+    >>> metrics['ppsf'].shape
+    (4, 8)
+    >>> round(metrics['ppsf'].loc['Chicago, IL - Southwest Side', 2016], 2)
+    112.65
+    >>> metrics['units'].loc['Chicago, IL', 2014]
+    1724.0
+    """
+
+    df = regions_rows(data, region_list)
+    grouped = df.groupby(['Region', 'Year'], observed=True, sort=True)
+
+    ppsf = grouped['Median Sale Ppsf'].median().unstack('Year')
+    sold = grouped['Homes Sold'].agg(['sum', 'count']).astype('float64')  # Homes Sold is a nullable integer
+    units = (sold['sum'] / sold['count']).unstack('Year')
+
+    # give every calendar year its own column so the shift below compares consecutive years
+    years = range(int(df['Year'].min()), int(df['Year'].max()) + 1) if len(df) else []
+    ppsf = ppsf.reindex(columns=years)
+    units = units.reindex(columns=years)
+    pct = (ppsf / ppsf.shift(1, axis=1) - 1) * 100
+
+    for matrix in (ppsf, pct, units):
+        matrix.index = matrix.index.astype(str)
+        matrix.index.name = 'Region'
+        matrix.columns.name = 'Year'
+
+    return {'ppsf': ppsf, 'ppsf_pct': pct, 'units': units}
+
+
+def region_year_matrix(data, metric, region_list=None):
+    """Return one metric of region_year_metrics.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param metric: one of METRICS
+    :param region_list: regions to compute, or None for every region in the data
+    :return: Region x Year dataframe of the metric
+    :raises: error if the metric is unknown
+
+    >>> region_year_matrix(pd.DataFrame(), 'price')
+    Traceback (most recent call last):
+    ValueError: Metric must be one of ppsf, ppsf_pct, units.
+    """
+
+    if metric not in METRICS:
+        raise ValueError('Metric must be one of {}.'.format(', '.join(METRICS)))
+
+    return region_year_metrics(data, region_list)[metric]
+
+
+def year_row(matrix, region, years_from=None, name=None):
+    """Return the row of a Region x Year matrix as a Year indexed series, keeping only the
+    years in which the region has data.
+
+    :param matrix: Region x Year dataframe
+    :param region: Specified region/area/community
+    :param years_from: matrix deciding which years the region has data in (defaults to matrix)
+    :param name: name of the returned series
+    :return: series indexed by Year (empty if the region is not in the matrix)
+    """
+
+    if years_from is None:
+        years_from = matrix
+    if region not in matrix.index:
+        return pd.Series([], index=pd.Index([], name='Year'), dtype='float64', name=name)
+
+    row = matrix.loc[region]
+    row = row[years_from.loc[region].notna()]
+    row.name = name
+
+    return row
+
+
+def solve_by_pattern(design, y):
+    """Least squares (minimum norm) fits of every column of y to the rows of a design matrix
+    where the column has a value. Columns sharing a pattern of missing rows are solved in one
+    np.linalg.lstsq call, so the cost grows with the number of columns only through that
+    solve.
+
+    :param design: Row x Coefficient array
+    :param y: Row x Column array, NaN where a column has no value
+    :return: generator of (rows, columns, coefficients, rank) per pattern with any values:
+        the boolean mask of the rows used, the column numbers, the Coefficient x Column
+        solution and the rank of design[rows]
+
+    >>> y = np.array([[1.0, 2.0], [2.0, np.nan], [3.0, 6.0]])
+    >>> [(columns.tolist(), coef.round(6).ravel().tolist()) for _, columns, coef, _ in
+    ...  solve_by_pattern(np.ones((3, 1)), y)]
+    [([1], [4.0]), ([0], [2.0])]
+    """
+
+    patterns, columns_of = np.unique(~np.isnan(y), axis=1, return_inverse=True)
+    for p in range(patterns.shape[1]):
+        rows = patterns[:, p]
+        if not rows.any():
+            continue
+        columns = np.flatnonzero(columns_of.ravel() == p)
+        coef, _, rank, _ = np.linalg.lstsq(design[rows], y[np.ix_(rows, columns)], rcond=None)
+        yield rows, columns, coef, rank
+
+
+def deoverlap_windows(sums, window):
+    """Estimate monthly values from sums over rolling windows of consecutive months. Redfin's
+    90 day periods start a month apart, so each window shares two of its three months with the
+    next one. The monthly values are the least squares (minimum norm) solution of the windows
+    they add up to, solved for every column sharing a pattern of missing windows at once;
+    negative estimates are clipped to 0.
+
+    :param sums: Window x Column array of window sums, one row per starting month, NaN where a
+        window is missing
+    :param window: number of months each window spans
+    :return: Month x Column array with len(sums) + window - 1 rows, NaN where no window covers
+        the month
+
+    >>> sums = np.array([[30.0], [30.0], [30.0], [30.0]])
+    >>> est = deoverlap_windows(sums, 3)
+    >>> est.shape, bool(np.allclose(est[0:3].sum(), 30) and np.allclose(est[1:4].sum(), 30))
+    ((6, 1), True)
+    >>> deoverlap_windows(sums, 1).ravel().tolist()
+    [30.0, 30.0, 30.0, 30.0]
+    """
+
+    sums = np.asarray(sums, dtype='float64')
+    if window <= 1:
+        return sums.copy()
+
+    n_windows, n_columns = sums.shape
+    coverage = np.zeros((n_windows, n_windows + window - 1))
+    for offset in range(window):
+        coverage[np.arange(n_windows), np.arange(n_windows) + offset] = 1.0
+
+    months = np.full((n_windows + window - 1, n_columns), np.nan)
+    for rows, columns, solved, _ in solve_by_pattern(coverage, sums):
+        covered = coverage[rows].any(axis=0)
+        months[np.ix_(covered, columns)] = np.clip(solved[covered], 0, None)
+
+    return months
+
+
+def _monthly_sales(df, deoverlap):
+    """Homes Sold per (Region, Year, Month), either as reported per period start or with the
+    overlapping rolling windows turned into monthly estimates."""
+
+    sold = df['Homes Sold'].astype('float64')
+    if not deoverlap:
+        return sold.groupby([df['Region'], df['Year'], df['Month']], observed=True).sum()
+
+    # one Window x Region matrix per window length, on a grid of consecutive months
+    month_no = df['Year'].astype('int64') * 12 + df['Month'].astype('int64') - 1
+    window = (df['Period Duration'].astype('int64') / 30).round().astype('int64').clip(lower=1)
+    estimates = []
+    for length, rows in df.groupby(window.to_numpy()).groups.items():
+        sums = sold.loc[rows].groupby([month_no.loc[rows], df.loc[rows, 'Region']], observed=True).sum().unstack()
+        sums = sums.reindex(range(sums.index.min(), sums.index.max() + 1))
+        months = deoverlap_windows(sums.to_numpy(), length)
+        grid = np.arange(sums.index[0], sums.index[0] + len(months))
+        frame = pd.DataFrame(months, index=grid, columns=sums.columns).stack()
+        estimates.append(frame)
+
+    sold = pd.concat(estimates)
+    month_no = sold.index.get_level_values(0)
+    index = pd.MultiIndex.from_arrays([sold.index.get_level_values(1), month_no // 12, month_no % 12 + 1],
+                                      names=['Region', 'Year', 'Month'])
+
+    return pd.Series(sold.to_numpy(), index=index).groupby(level=[0, 1, 2], observed=True).sum()
+
+
+@memoized
+def region_month_share(data, years=None, region_list=None, per_year=False, deoverlap=False):
+    """Compute the share of each region's homes sold falling in each calendar month, for
+    every region at once from one grouped reduction over (Region, Year, Month).
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param years: (first, last) year of sales counted, or None for every year
+    :param region_list: regions to compute, or None for every region in the data
+    :param per_year: take the share within each year and average it over the years, so every
+        year weighs the same however many homes sold in it
+    :param deoverlap: count monthly estimates de-overlapped from the rolling periods (see
+        deoverlap_windows) instead of the Homes Sold of each period start
+    :return: Region x Month dataframe whose rows sum to 1
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> share = region_month_share(df_all, years=(2013, 2018))
+    >>> share.shape
+    (224, 12)
+    >>> chi = chicago_housing_analysis.monthly_sale_share(df_all, range(1, 13))
+    >>> bool(np.allclose(share.loc['Chicago, IL'], chi))
+    True
+    >>> share = region_month_share(df_all, years=(2013, 2018), deoverlap=True)
+    >>> bool(np.allclose(share.sum(axis=1), 1))
+    True
+    """
+
+    df = regions_rows(data, region_list)
+    sold = _monthly_sales(df, deoverlap)
+    if years is not None:
+        year = sold.index.get_level_values('Year')
+        sold = sold[(year >= years[0]) & (year <= years[1])]
+
+    # (Region, Year) x Month table of homes sold
+    table = sold.unstack('Month').reindex(columns=range(1, 13)).fillna(0)
+    if per_year:
+        share = table.div(table.sum(axis=1), axis=0).groupby(level='Region', observed=True).mean()
+    else:
+        totals = table.groupby(level='Region', observed=True).sum()
+        share = totals.div(totals.sum(axis=1), axis=0)
+
+    share.index = share.index.astype(str)
+    share.index.name = 'Region'
+    share.columns.name = 'Month'
+
+    return share
@@ -0,0 +1,140 @@
+# region_rank.py
+# Top-K / bottom-K regions per year over the Region x Year matrices, by partial selection.
+
+
+import numpy as np
+import pandas as pd
+
+from region_matrix import region_year_matrix
+
+
+def top_k(matrix, k, bottom=False):
+    """Select the k regions with the highest (lowest with bottom=True) value in every year
+    column of a Region x Year matrix at once. np.argpartition picks the k per column without
+    sorting the rest, and only those k are then ordered. Regions without a value in a year
+    are never selected for it.
+
+    :param matrix: Region x Year dataframe
+    :param k: number of regions per year
+    :param bottom: select the lowest values instead of the highest
+    :return: dictionary of year to a series of region to value, ranked best first
+
+    >>> matrix = pd.DataFrame({2018: [3.0, 1.0, np.nan, 2.0], 2019: [1.0, 4.0, 5.0, np.nan]},
+    ...                       index=pd.Index(['a', 'b', 'c', 'd'], name='Region'))
+    >>> ranks = top_k(matrix, 2)
+    >>> ranks[2018].to_dict(), ranks[2019].to_dict()
+    ({'a': 3.0, 'd': 2.0}, {'c': 5.0, 'b': 4.0})
+    >>> top_k(matrix, 2, bottom=True)[2019].to_dict()
+    {'a': 1.0, 'b': 4.0}
+    """
+
+    values = matrix.to_numpy(dtype='float64')
+    # negate so the best values are always the smallest; missing values sort after every real one
+    keys = np.where(np.isnan(values), np.inf, values if bottom else -values)
+    k = min(k, len(matrix))
+    if k <= 0:
+        return {year: pd.Series([], dtype='float64', name=year) for year in matrix.columns}
+
+    chosen = np.argpartition(keys, k - 1, axis=0)[:k] if k < len(matrix) else np.argsort(keys, axis=0)
+    chosen = np.take_along_axis(chosen, np.argsort(np.take_along_axis(keys, chosen, axis=0), axis=0, kind='stable'),
+                                axis=0)
+
+    names = matrix.index.to_numpy()
+    ranks = {}
+    for j, year in enumerate(matrix.columns):
+        rows = chosen[:, j]
+        rows = rows[np.isfinite(keys[rows, j])]
+        ranks[year] = pd.Series(values[rows, j], index=pd.Index(names[rows], name=matrix.index.name), name=year)
+
+    return ranks
+
+
+def rank_regions(data, metric='ppsf', k=8, year=None, bottom=False, region_list=None):
+    """Rank regions on one of the Region x Year metrics.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param metric: ppsf, ppsf_pct or units
+    :param k: number of regions to return per year
+    :param year: a single year to rank, or None for every year
+    :param bottom: return the lowest values instead of the highest
+    :param region_list: regions eligible for the ranking (e.g. the communities only), or None
+        for every region in the data
+    :return: series of region to value for the year, or a dictionary of year to such series
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> import region_tree
+    >>> communities = region_tree.load_tree().leaves
+    >>> list(rank_regions(df_all, 'ppsf', k=3, year=2019, region_list=communities).index)
+    ['Chicago, IL - Near North Side', 'Chicago, IL - Lincoln Park', 'Chicago, IL - Near South Side']
+    """
+
+    matrix = region_year_matrix(data, metric)
+    if region_list is not None:
+        matrix = matrix.loc[matrix.index.intersection(pd.Index(region_list), sort=False)]
+    if year is not None:
+        return top_k(matrix[[year]], k, bottom)[year]
+
+    return top_k(matrix, k, bottom)
+
+
+def fastest_risers(data, k=8, year=None, region_list=None):
+    """Return the regions with the largest % change of Median Sale Ppsf against the previous
+    year; see rank_regions."""
+
+    return rank_regions(data, 'ppsf_pct', k, year, region_list=region_list)
+
+
+class RankingTracker:
+    """Top-K rankings kept up to date as new periods are ingested into a
+    housing_incremental.AggregateState: only the years whose buckets changed are ranked again.
+
+    :param k: number of regions per year
+    :param metric: ppsf, ppsf_pct or units
+    :param bottom: keep the lowest values instead of the highest
+    :param region_list: regions eligible for the ranking, or None for every region
+
+    >>> import chicago_housing_analysis, housing_incremental
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> state, tracker = housing_incremental.AggregateState(), RankingTracker(5)
+    >>> sorted(tracker.update(state, state.ingest(df_all[df_all['Year'] < 2018])))[-1]
+    2017
+    >>> sorted(tracker.update(state, state.ingest(df_all)))
+    [2018, 2019]
+    >>> tracker.ranks[2019].equals(rank_regions(df_all, 'ppsf', k=5, year=2019))
+    True
+    """
+
+    def __init__(self, k=8, metric='ppsf', bottom=False, region_list=None):
+        self.k = k
+        self.metric = metric
+        self.bottom = bottom
+        self.regions = None if region_list is None else set(region_list)
+        self.ranks = {}
+
+    def update(self, state, touched):
+        """Re-rank the years touched by an ingest (and the following years, whose % change
+        moves with them).
+
+        :param state: AggregateState the rows were ingested into
+        :param touched: set of (region, year) returned by its ingest or add
+        :return: set of the years re-ranked
+        """
+
+        years = {year for _, year in touched}
+        if self.metric == 'ppsf_pct':
+            years |= {year + 1 for year in years}
+
+        matrix = state.metrics()[self.metric]
+        buckets = state.totals.index
+        for year in years:
+            # only the regions with a bucket in the year are ranked for it
+            regions = buckets[buckets.get_level_values('Year') == year].get_level_values('Region')
+            if self.regions is not None:
+                regions = regions[regions.isin(self.regions)]
+            if not len(regions):
+                self.ranks.pop(year, None)
+                continue
+            self.ranks[year] = top_k(matrix.loc[regions, [year]].sort_index(), self.k, self.bottom)[year]
+
+        return {year for year in years if year in self.ranks}
@@ -0,0 +1,116 @@
+# region_rolling.py
+# Trailing window analytics over the monthly Redfin periods, as Region x Period matrices
+# computed for every region at once.
+
+
+import pandas as pd
+
+from housing_memo import memoized
+from region_index import regions_rows
+from region_matrix import _monthly_sales
+
+
+@memoized
+def region_period_matrix(data, column, region_list=None, aggfunc='mean'):
+    """Lay one column out as a Region x Period matrix with one grouped pass: a row per region,
+    a column per Period Begin on a gapless monthly grid, NaN where the region has no period.
+    A region listed more than once for a period gets the aggfunc of its rows: the mean suits
+    prices, while counts such as Homes Sold add up.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param column: column to lay out (e.g. Median Sale Ppsf or Homes Sold)
+    :param region_list: regions to include, or None for every region in the data
+    :param aggfunc: 'mean' or 'sum' of the rows of a region and period
+    :return: Region x Period dataframe
+
+    >>> df_all = pd.read_csv('chicago_housing_all_residential_test.csv', sep=',')
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.df_cleaning(df_all)
+    >>> region_period_matrix(df_all, 'Homes Sold').loc['Chicago, IL'].dropna().tolist()
+    [1724.0]
+    """
+
+    df = regions_rows(data, region_list)
+    grouped = df.groupby(['Region', 'Period Begin'], observed=True)[column]
+    values = grouped.sum(min_count=1) if aggfunc == 'sum' else grouped.agg(aggfunc)
+    matrix = values.unstack('Period Begin')
+
+    return _on_grid(matrix)
+
+
+def _on_grid(matrix):
+    """Reindex the Period columns of a Region x Period matrix to every month start between the
+    first and last period."""
+
+    if matrix.shape[1]:
+        matrix = matrix.reindex(columns=pd.date_range(matrix.columns.min(), matrix.columns.max(), freq='MS'))
+    matrix.index = matrix.index.astype(str)
+    matrix.index.name = 'Region'
+    matrix.columns.name = 'Period Begin'
+
+    return matrix.astype('float64')
+
+
+@memoized
+def rolling_metrics(data, window=12, min_periods=None, region_list=None, deoverlap=False):
+    """Trailing window metrics of every region over the monthly periods. Each is one pandas
+    rolling call over the Period x Region layout, so every region's windows slide in compiled
+    code: the median keeps a skiplist of the window (O(log w) per step) and the sums and
+    deviations are running totals, never recomputed window by window.
+
+    * ppsf_median: trailing median of Median Sale Ppsf
+    * ppsf_volatility: trailing standard deviation of the month over month % change of
+      Median Sale Ppsf
+    * sold_sum: trailing sum of Homes Sold. Redfin's 90 day periods overlap, so each sale is
+      counted in about three consecutive periods; with deoverlap=True the monthly estimates of
+      region_matrix.deoverlap_windows are summed instead
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param window: window length in months
+    :param min_periods: fewest periods with data for a window to get a value (default window)
+    :param region_list: regions to include, or None for every region in the data
+    :param deoverlap: sum de-overlapped monthly Homes Sold estimates
+    :return: dictionary of metric name to Region x Period dataframe, the period being the
+        last Period Begin of the window
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> rolling = rolling_metrics(df_all)
+    >>> rolling['ppsf_median'].shape
+    (224, 94)
+    >>> ppsf = region_period_matrix(df_all, 'Median Sale Ppsf').loc['Chicago, IL - Lake View']
+    >>> end = pd.Timestamp('2019-06-01')
+    >>> bool(rolling['ppsf_median'].loc['Chicago, IL - Lake View', end] == ppsf[:end][-12:].median())
+    True
+    >>> bool(rolling['sold_sum'].loc['Chicago, IL', end] == df_all[(df_all['Region'] == 'Chicago, IL') &
+    ...     (df_all['Period Begin'] > end - pd.DateOffset(months=12)) &
+    ...     (df_all['Period Begin'] <= end)]['Homes Sold'].sum())
+    True
+
+    Chicago, IL - Rosehill is listed twice for every period, and both rows' sales count:
+
+    >>> float(rolling['sold_sum'].loc['Chicago, IL - Rosehill', end])
+    205.0
+    """
+
+    if min_periods is None:
+        min_periods = window
+
+    ppsf = region_period_matrix(data, 'Median Sale Ppsf', region_list).T
+    if deoverlap:
+        sold = _monthly_sales(regions_rows(data, region_list), deoverlap=True)
+        index = pd.to_datetime(pd.DataFrame({'year': sold.index.get_level_values('Year'),
+                                             'month': sold.index.get_level_values('Month'), 'day': 1}))
+        sold = pd.Series(sold.to_numpy(), index=[sold.index.get_level_values('Region'), index]).unstack()
+        sold = _on_grid(sold).reindex(index=ppsf.columns, columns=ppsf.index).T
+    else:
+        sold = region_period_matrix(data, 'Homes Sold', region_list, aggfunc='sum').T
+
+    change = ppsf.pct_change(fill_method=None) * 100
+    rolled = {
+        'ppsf_median': ppsf.rolling(window, min_periods=min_periods).median(),
+        'ppsf_volatility': change.rolling(window, min_periods=min_periods).std(),
+        'sold_sum': sold.rolling(window, min_periods=min_periods).sum(),
+    }
+
+    return {name: matrix.T for name, matrix in rolled.items()}
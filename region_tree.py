@@ -0,0 +1,200 @@
+# region_tree.py
+# Region hierarchy (city -> side -> community) and sales weighted rollups of the yearly
+# metrics, computed bottom-up from the leaf regions in one grouped pass.
+
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from housing_memo import memoized
+from region_index import regions_rows
+
+
+DEFAULT_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports', 'chicago_hierarchy.json')
+
+
+class RegionTree:
+    """Parent and children links of a region hierarchy, read from a nested mapping: every key
+    is a region whose value maps its child regions, and a list holds leaf regions.
+
+    :param nested: nested dictionary, e.g. {'city': {'side': ['community', ...], ...}}
+
+    >>> tree = RegionTree({'Chicago, IL': {'North': ['Lake View', 'Lincoln Park'], 'West': ['Austin']}})
+    >>> tree.children['Chicago, IL'], tree.parent['Austin'], tree.leaves
+    (['North', 'West'], 'West', ['Lake View', 'Lincoln Park', 'Austin'])
+    >>> tree.descendants('Chicago, IL', depth=2)
+    ['Lake View', 'Lincoln Park', 'Austin']
+    """
+
+    def __init__(self, nested):
+        self.children = {}
+        self.parent = {}
+        self.nodes = []  # parents before their children
+        self.roots = list(nested)
+        self._key = json.dumps(nested, sort_keys=True)
+
+        def walk(name, sub, parent):
+            if name in self.parent:
+                raise ValueError('Region {} appears twice in the hierarchy.'.format(name))
+            self.nodes.append(name)
+            self.parent[name] = parent
+            kids = list(sub) if isinstance(sub, (dict, list)) else []
+            self.children[name] = kids
+            for kid in kids:
+                walk(kid, sub[kid] if isinstance(sub, dict) else None, name)
+
+        for root in self.roots:
+            walk(root, nested[root], None)
+        self.leaves = [name for name in self.nodes if not self.children[name]]
+
+    def __eq__(self, other):
+        return isinstance(other, RegionTree) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)  # trees are memo cache key parts
+
+    def descendants(self, region, depth=1):
+        """Return the regions depth levels below a region (its children for depth=1)."""
+
+        level = [region]
+        for _ in range(depth):
+            level = [kid for name in level for kid in self.children.get(name, [])]
+
+        return level
+
+
+def load_tree(path=DEFAULT_TREE):
+    """Read a region hierarchy from a JSON file.
+
+    >>> tree = load_tree()
+    >>> len(tree.children['Chicago, IL']), tree.parent['Chicago, IL - Lake View']
+    (9, 'Chicago, IL - North Side')
+    """
+
+    with open(path) as f:
+        return RegionTree(json.load(f))
+
+
+class RegionRollup:
+    """Sales weighted yearly subtotals of every node of a region tree. Each node holds the sum
+    of Median Sale Ppsf x monthly Homes Sold, the monthly Homes Sold behind it and the average
+    monthly Homes Sold, each the sum over its children, so every level is read off the same
+    subtotals.
+
+    :param tree: RegionTree
+    :param sums: Node x Year x 4 array of (ppsf x sold, sold with a ppsf, average monthly sold,
+        rows) subtotals
+    :param years: the Year columns
+    """
+
+    def __init__(self, tree, sums, years):
+        self.tree = tree
+        index = pd.Index(tree.nodes, name='Region')
+        columns = pd.Index(years, name='Year')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ppsf = np.where(sums[..., 1] > 0, sums[..., 0] / sums[..., 1], np.nan)
+        units = np.where(sums[..., 3] > 0, sums[..., 2], np.nan)
+        self.metrics = {'ppsf': pd.DataFrame(ppsf, index=index, columns=columns),
+                        'units': pd.DataFrame(units, index=index, columns=columns),
+                        'sold': pd.DataFrame(sums[..., 1], index=index, columns=columns)}
+
+    def matrix(self, metric='ppsf'):
+        """Return the Node x Year matrix of a metric (ppsf, units or sold)."""
+
+        if metric not in self.metrics:
+            raise ValueError('Metric must be one of {}.'.format(', '.join(self.metrics)))
+
+        return self.metrics[metric]
+
+    def node(self, region, metric='ppsf'):
+        """Return a node's metric by year, keeping the years with data."""
+
+        return self.matrix(metric).loc[region].dropna()
+
+    def with_children(self, region, metric='ppsf'):
+        """Return the rows of a node followed by its children, as a report shows a level."""
+
+        return self.matrix(metric).loc[[region] + self.tree.children[region]]
+
+    def drill_down(self, region, year, metric='ppsf', depth=1, ascending=False):
+        """Rank the regions depth levels under a node by a metric in one year, e.g. every
+        community under a side by its sales weighted Ppsf. Regions without data that year are
+        left out.
+
+        :return: series of region to value, best first (smallest first with ascending=True)
+        """
+
+        values = self.matrix(metric).loc[self.tree.descendants(region, depth), year].dropna()
+
+        return values.sort_values(ascending=ascending, kind='stable')
+
+
+@memoized
+def region_rollup(data, tree=None):
+    """Roll the leaf regions of a tree up to every node: one groupby over the leaves' rows
+    gives the (Region, Year) sums, and every parent adds up its children's subtotals.
+
+    Each leaf period's Homes Sold is first turned into a monthly figure by dividing it by the
+    months its Period Duration spans (3 for the 90 day community windows, 1 for the 30 day
+    city periods), so a parent is in the same unit as a region measured monthly. A node's
+    ppsf is the monthly Homes Sold weighted mean of the Median Sale Ppsf of the periods under
+    it, its units the sum of its children's average monthly Homes Sold. The weighted mean of
+    the communities' medians is not the median of the parent's sales, and the hierarchy may
+    leave out some communities, so the rollup only approximates a parent measured directly.
+
+    :param data: cleaned dataframe, or a RegionIndex built on it
+    :param tree: RegionTree (default the Chicago hierarchy in reports/chicago_hierarchy.json)
+    :return: RegionRollup
+
+    >>> import chicago_housing_analysis
+    >>> df_all = chicago_housing_analysis.read_cleaned_csv('chicago_housing_all_residential.csv')
+    >>> rollup = region_rollup(df_all)
+    >>> side = rollup.with_children('Chicago, IL - North Side', 'units')[2019]
+    >>> bool(np.isclose(side.iloc[0], side.iloc[1:].sum()))
+    True
+    >>> rollup.drill_down('Chicago, IL - Central Chicago', 2019).index[0]
+    'Chicago, IL - Near North Side'
+
+    The city rolled up from its communities is close to the city measured directly:
+
+    >>> measured = chicago_housing_analysis.monthly_unit_sold_yr(df_all, 'Chicago, IL')[2019]
+    >>> rolled = rollup.node('Chicago, IL', 'units')[2019]
+    >>> round(measured), round(rolled), bool(abs(rolled / measured - 1) < 0.1)
+    (2687, 2551, True)
+    >>> measured = chicago_housing_analysis.area_ppsf_by_yr(df_all, 'Chicago, IL')[2019]
+    >>> rolled = rollup.node('Chicago, IL')[2019]
+    >>> round(measured), round(rolled), bool(abs(rolled / measured - 1) < 0.1)
+    (200, 217, True)
+    """
+
+    if tree is None:
+        tree = load_tree()
+
+    df = regions_rows(data, tree.leaves)
+    has_ppsf = df['Median Sale Ppsf'].notna()
+    months = (df['Period Duration'].astype('int64') / 30).round().clip(lower=1)
+    sold = df['Homes Sold'].astype('float64') / months
+    parts = pd.DataFrame({'Region': df['Region'].astype(str), 'Year': df['Year'],
+                          'weighted': (df['Median Sale Ppsf'] * sold).where(has_ppsf, 0.0),
+                          'sold_ppsf': sold.where(has_ppsf, 0.0), 'sold': sold})
+    grouped = parts.groupby(['Region', 'Year']).agg(weighted=('weighted', 'sum'), sold_ppsf=('sold_ppsf', 'sum'),
+                                                    sold=('sold', 'sum'), rows=('sold', 'count'))
+    grouped['units'] = grouped['sold'] / grouped['rows']
+
+    years = sorted(grouped.index.get_level_values('Year').unique())
+    position = {name: i for i, name in enumerate(tree.nodes)}
+    sums = np.zeros((len(tree.nodes), len(years), 4))
+    for k, column in enumerate(['weighted', 'sold_ppsf', 'units', 'rows']):
+        leaf = grouped[column].unstack('Year').reindex(index=tree.leaves, columns=years).fillna(0)
+        sums[[position[name] for name in tree.leaves], :, k] = leaf.to_numpy()
+
+    # children come after their parents in tree.nodes, so a reverse walk sums bottom-up
+    for name in reversed(tree.nodes):
+        kids = tree.children[name]
+        if kids:
+            sums[position[name]] = sums[[position[kid] for kid in kids]].sum(axis=0)
+
+    return RegionRollup(tree, sums, years)